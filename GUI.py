@@ -1,13 +1,20 @@
-import json
+import math
+import os
+import sqlite3
+import struct
+import sys
 import tkinter as tk
 import tkinter.ttk as ttk
-from time import time
+from time import perf_counter_ns
 from tkinter.messagebox import showerror
 
 import PIL.Image
 import PIL.ImageTk
 
+import autopilot
 import logic as game
+import results
+import settings
 
 # from tkinter.colorchooser import askcolor
 
@@ -32,55 +39,59 @@ COLOURS_COLBLIND = {"snake_tail": "#0a284b",
 
 COLOUR_BLIND_MODE = False
 
+# Time each part of the game tick and the board drawing. Shown on the pause menu
+PROFILE = "--profile" in sys.argv
+PROFILE_FILE = os.path.join(settings.FILES_DIR, "profile.json")
+
+# Start the autopilot demo after the start page has been left alone this long
+ATTRACT_AFTER_MS = 30000
+
+# Where the pause menu saves the game to and resumes it from
+SAVE_FILE = os.path.join(settings.FILES_DIR, "save.snake")
+
+IMAGES_DIR = os.path.join(settings.FILES_DIR, "Images")
+
+# Finished games are saved here under this name, the end screen shows the best and rank from it
+PLAYER = results.default_player()
+RESULTS = None  # results.ResultsStore, opened when the first game ends
+
+# How often the GUI loop checks in while no game is running
+IDLE_POLL_MS = 50
+
+# Board cells are square, this is the biggest a cell is drawn before the window is resized
+CELL_SIZE = 20
+MAX_BOARD_PIXELS = 800
+
 BUTTONS = {"left":"Left",
            "right":"Right",
            "up":"Up",
            "down":"Down"}
 
 
-def load_settings(filename="settings.json"):
-    global COLOUR_BLIND_MODE
+def load_settings(filename: str = settings.GUI_FILE):
     """Loads the settings into memory"""
-    filepath = "Files/Settings/" + filename
+    global COLOUR_BLIND_MODE
 
     try:
-        with open(filepath, "r") as file:
-            data = json.load(file)
-    except Exception as e:
+        data = settings.gui_settings(filename).get()
+    except ValueError as e:
         print(e)
         showerror("Error loading settings data",
                   "An error occurred when trying to fetch settings data. Reverting to default data.")
         return None
 
-    if "colour_blind" in data:
-        if type(data["colour_blind"]) is bool:
-            COLOUR_BLIND_MODE = data["colour_blind"]
-
-    if "control_up" in data:
-        BUTTONS["up"] = data["control_up"]
-
-    if "control_down" in data:
-        BUTTONS["down"] = data["control_down"]
-
-    if "control_left" in data:
-        BUTTONS["left"] = data["control_left"]
-
-    if "control_right" in data:
-        BUTTONS["right"] = data["control_right"]
+    COLOUR_BLIND_MODE = data["colour_blind"]
+    BUTTONS["up"] = data["control_up"]
+    BUTTONS["down"] = data["control_down"]
+    BUTTONS["left"] = data["control_left"]
+    BUTTONS["right"] = data["control_right"]
 
 
-def save_settings(filename: str = "settings.json", colour_blind: bool = None,
+def save_settings(filename: str = settings.GUI_FILE, colour_blind: bool = None,
                   control_left: str = None, control_right: str = None,
                   control_up: str = None, control_down: str = None) -> bool:
-    """Update the settings file"""
-
-    filepath = "Files/Settings/" + filename
-
-    try:
-        with open(filepath, "r") as file:
-            data = json.load(file.read())
-    except:
-        data = {}
+    """Update the settings file. Only the given settings change, and the file is written in the background"""
+    data = {}
 
     if colour_blind is not None:
         data["colour_blind"] = colour_blind
@@ -97,19 +108,16 @@ def save_settings(filename: str = "settings.json", colour_blind: bool = None,
     if control_down is not None:
         data["control_down"] = control_down
 
-    with open(filepath, "w") as file:
-        json.dump(data, file)
+    return settings.gui_settings(filename).update(**data)
 
-    return True
 
-
-GAME = game.Game(settings_file="game_settings.json")
+GAME = game.Game(settings_file="game_settings.json", profile=PROFILE, track_changes=True)
 
 
 def restart_game():
     global GAME
     del GAME
-    GAME = game.Game(settings_file="game_settings.json")
+    GAME = game.Game(settings_file="game_settings.json", profile=PROFILE, track_changes=True)
 
 
 class Window(tk.Tk):
@@ -119,10 +127,10 @@ class Window(tk.Tk):
         tk.Tk.__init__(self, *args, **kwargs)
 
         self.title('Hungry Python')
-        self.iconbitmap(r'Files/Images/icon.ico')
+        self.iconbitmap(os.path.join(IMAGES_DIR, "icon.ico"))
         # Main Container
         container = tk.Frame(self)
-        container.pack(side="top", fill="both")
+        container.pack(side="top", fill="both", expand=True)
         container.grid_rowconfigure(0, weight=1)
         container.grid_columnconfigure(0, weight=1)
 
@@ -189,7 +197,7 @@ class Start(tk.Frame):
         # self.grid(padx=50, pady=25)
 
         # Title image
-        img = PIL.Image.open("Files/Images/Title.png")
+        img = PIL.Image.open(os.path.join(IMAGES_DIR, "Title.png"))
         photo = PIL.ImageTk.PhotoImage(img)
 
         title = tk.Label(self, image=photo, bg=COLOURS["background"])
@@ -200,6 +208,10 @@ class Start(tk.Frame):
         tk.Button(self, text="Start", height=1, width=20, font=FONT_M, bg=COLOURS["button_good"],
                   command=lambda: self.start()).pack(side="top", pady=10)
 
+        # Demo Button
+        tk.Button(self, text="Watch Demo", height=1, width=20, font=FONT_M, bg=COLOURS["button_default"],
+                  command=lambda: self.start_demo()).pack(side="top", pady=10)
+
         # Settings Button
         tk.Button(self, text="Settings", height=1, width=20, font=FONT_M, bg=COLOURS["button_default"],
                   command=lambda: controller.set_page(Settings.page_name)).pack(side="top", pady=10)
@@ -208,13 +220,29 @@ class Start(tk.Frame):
         tk.Button(self, text="Exit", height=1, width=20, font=FONT_M, bg=COLOURS["button_bad"],
                   command=lambda: controller.destroy()).pack(side="top", pady=10)
 
+        self.attract_job = None
+
     def start(self):
         GAME.start_game()
         self.controller.set_page("InProgress")
 
+    def start_demo(self):
+        """Start a new game played by the autopilot"""
+        restart_game()
+        GAME.policy = autopilot.Autopilot()
+        self.start()
+
+    def attract(self):
+        """Show the demo if nobody has done anything on the start page"""
+        self.attract_job = None
+        if self.controller.CurrentPage == Start.page_name:
+            self.start_demo()
+
     def on_show(self):
         """Runs when this page is shown"""
-        pass
+        if self.attract_job is not None:
+            self.after_cancel(self.attract_job)
+        self.attract_job = self.after(ATTRACT_AFTER_MS, self.attract)
 
     def initialise(self):
         pass
@@ -388,13 +416,18 @@ class Settings(tk.Frame):
                 BUTTONS[dirct] = self.new_buttons[dirct]
 
         # Game settings
-        height = int(self.height_entry.get())
-        width = int(self.width_entry.get())
-        tick = int(self.tick_entry.get())
-
-        if not GAME.update_settings(height=height, width=width, tick_speed=tick):
+        try:
+            height = int(self.height_entry.get())
+            width = int(self.width_entry.get())
+            tick = int(self.tick_entry.get())
+        except ValueError:
+            height = width = tick = None
+
+        if height is None or not GAME.update_settings(height=height, width=width, tick_speed=tick):
+            low, high = settings.GAME_SCHEMA["width"][1:]
             showerror("An error has occurred.",
-                      "An error occurred when trying to update the game settings. Please try again.")
+                      f"The game settings could not be updated. The width and height must be whole numbers "
+                      f"from {low} to {high}, and the tick speed a whole number of milliseconds.")
         else:
             GAME.load_settings()
 
@@ -442,8 +475,6 @@ class InProgress(tk.Frame):
 
         self.configure(bg=COLOURS["foreground"])
 
-        self.last_update = time()
-
         stats_bar = tk.Frame(self, bg=COLOURS["foreground"])
         stats_bar.pack(side="top", fill="x")
 
@@ -464,98 +495,155 @@ class InProgress(tk.Frame):
                                  command=lambda: controller.set_page(PauseMenu.page_name))
         pause_button.pack(side="right")
 
-        # TODO: Board redraw on window size change
-        #       Make the board size proportional to the window size.
-        #       Alternatively, lock the window size.
-        #       Though, with a contrasting background, it is not as important
         # Board Set up
-        self.board_area = tk.Frame(self, bg=COLOURS["foreground"])
-        self.board_area.pack(side="top")
+        # The board is a single canvas. Empty cells are just the board background,
+        # only snake, food and obstacle cells get a rectangle, which is kept until the cell empties again.
+        self.board_canvas = tk.Canvas(self, bg=COLOURS["foreground"], highlightthickness=0)
+        self.board_canvas.pack(side="top", fill="both", expand=True)
+        self.board_canvas.bind("<Configure>", lambda event: self.resize_board(event.width, event.height))
 
-        self.board_items = []  # a list of lists, similar to the game board. hols widgets
+        self.board_background = None  # Rectangle covering the whole board
+        self.board_items = {}  # (x, y) -> rectangle, for cells that aren't empty
+        self.board_text = {}  # (x, y) -> what the rectangle shows, so Tk doesn't have to be asked
+
+        self.board_game = None  # The game and options the canvas was last set up for
+        self.board_colour_blind = COLOUR_BLIND_MODE
+
+        self.cell_size = CELL_SIZE
+        self.board_offset = (0, 0)
 
     def setup_board(self):
-        """Create the board and board widgets"""
-        self.board_items = []
-
-        for child in self.board_area.winfo_children():
-            child.destroy()
-
-        for y in range(GAME.board.height):
-            row = []
-            for x in range(GAME.board.width):
-                # TODO: Make the width and height of label configurable (always keep in a ratio of 2:1)
-                w = tk.Label(self.board_area, width=16, height=8, font=("Helvetica", 1),
-                             text=GAME.board.pos_lookup(x, y))
-                w.grid(row=y, column=x, sticky="nsew")
-                row.append(w)
-            self.board_items.append(row)
+        """Set up the canvas for the current game. Only needed for a new game or board size"""
+        self.board_canvas.delete("all")
+        self.board_items = {}
+        self.board_text = {}
+
+        self.board_game = (GAME, GAME.board.width, GAME.board.height)
+        self.board_colour_blind = COLOUR_BLIND_MODE
+
+        # Ask for a sensible size to begin with, it is scaled to fit the window afterwards
+        self.cell_size = max(1, min(CELL_SIZE, MAX_BOARD_PIXELS // max(GAME.board.width, GAME.board.height)))
+        self.board_canvas.configure(width=self.cell_size * GAME.board.width,
+                                    height=self.cell_size * GAME.board.height)
+
+        self.board_offset = (0, 0)
+        self.board_background = self.board_canvas.create_rectangle(
+            *self.cell_coords(0, 0, GAME.board.width, GAME.board.height), width=0, fill=COLOURS["background"])
+        self.resize_board(self.board_canvas.winfo_width(), self.board_canvas.winfo_height())
+
+        # Draw everything once, after this only the changed cells are redrawn.
+        # Empty cells are just the background, so only the filled ones need drawing
+        GAME.pop_changed_cells()
+        for x, y in GAME.board.filled_cells():
+            self.draw_cell(x, y)
+        self.ScoreText.configure(text=str(GAME.snake.level))
+
+    def resize_board(self, width: int, height: int) -> None:
+        """Scale the cells so the board fits in the given canvas size"""
+        if self.board_game is None or width <= 1 or height <= 1:
+            return None
+
+        board_width, board_height = GAME.board.width, GAME.board.height
+        self.cell_size = max(1, min(width // board_width, height // board_height))
+        self.board_offset = ((width - self.cell_size * board_width) // 2,
+                             (height - self.cell_size * board_height) // 2)
+
+        self.board_canvas.coords(self.board_background, *self.cell_coords(0, 0, board_width, board_height))
+        for (x, y), item in self.board_items.items():
+            self.board_canvas.coords(item, *self.cell_coords(x, y))
+
+    def cell_coords(self, x: int, y: int, width: int = 1, height: int = 1) -> tuple:
+        """Canvas coordinates of the rectangle covering a cell (or block of cells)"""
+        off_x, off_y = self.board_offset
+        size = self.cell_size
+        return off_x + x * size, off_y + y * size, off_x + (x + width) * size, off_y + (y + height) * size
+
+    def cell_colour(self, place_text: str) -> str:
+        """The colour to fill a cell with"""
+        if place_text == "S":
+            key = "snake_head"
+        elif place_text == "s":
+            key = "snake_tail"
+        elif place_text == "X":
+            key = "obstacle"
+        elif place_text == "O":
+            key = "snake_food"
+        else:
+            key = "background"
+
+        if COLOUR_BLIND_MODE and key in COLOURS_COLBLIND:
+            return COLOURS_COLBLIND[key]
+        return COLOURS[key]
+
+    def draw_cell(self, x: int, y: int) -> None:
+        """Update a single cell to match the game"""
+        if GAME.board.is_occupied(x, y):
+            if x == GAME.snake.X and y == GAME.snake.Y:
+                place_text = "S"
+            else:
+                place_text = "s"
+        else:
+            lookup = GAME.board.pos_lookup(x, y)
+            if lookup == game.A:
+                place_text = ""
+            elif lookup == game.O:
+                place_text = "X"
+            elif lookup == game.F:
+                place_text = "O"
+            else:
+                place_text = str(GAME.board.pos_lookup(x, y))
+
+        if self.board_text.get((x, y), "") == place_text:
+            return None
+
+        item = self.board_items.get((x, y))
+        if place_text == "":
+            # Empty cells show the board background, so the rectangle isn't needed any more
+            self.board_canvas.delete(item)
+            del self.board_items[(x, y)]
+            del self.board_text[(x, y)]
+            return None
+
+        if item is None:
+            self.board_items[(x, y)] = self.board_canvas.create_rectangle(*self.cell_coords(x, y), width=0,
+                                                                          fill=self.cell_colour(place_text))
+        else:
+            self.board_canvas.itemconfigure(item, fill=self.cell_colour(place_text))
+        self.board_text[(x, y)] = place_text
+
+    def recolour_board(self) -> None:
+        """Refill every rectangle, used when the colour mode changes"""
+        self.board_colour_blind = COLOUR_BLIND_MODE
+        for pos, item in self.board_items.items():
+            self.board_canvas.itemconfigure(item, fill=self.cell_colour(self.board_text[pos]))
 
     def board_update(self):
         """Update the visuals on the board"""
-        if GAME.last_update > self.last_update:
-            self.last_update = time()
-
+        changed = GAME.pop_changed_cells()
+        if changed:
+            start = perf_counter_ns()
             score = GAME.snake.level
             self.ScoreText.configure(text=str(score))
-            # We loop through each grid place, anc check for changes, if there isn't changes, dont update
-            for y in range(GAME.board.height):
-                for x in range(GAME.board.width):
-                    place_text = ""
-
-                    node_found = False
-
-                    for snakeNode in game.AllSnakeNodes:
-                        if snakeNode.X == x and snakeNode.Y == y:
-                            node_found = True
-                            if snakeNode.is_head:
-                                place_text = "S"
-                            else:
-                                place_text = "s"
-                            break
-
-                    if not node_found:
-                        lookup = GAME.board.pos_lookup(x, y)
-                        if lookup == game.A:
-                            place_text = ""
-                        elif lookup == game.O:
-                            place_text = "X"
-                        elif lookup == game.F:
-                            place_text = "O"
-                        else:
-                            place_text = str(GAME.board.pos_lookup(x, y))
-
-                    if self.board_items[y][x]['text'] != place_text:
-                        if place_text == "S":
-                            if COLOUR_BLIND_MODE:
-                                self.board_items[y][x].configure(bg=COLOURS_COLBLIND["snake_head"],
-                                                                 fg=COLOURS_COLBLIND["snake_head"])
-                            else:
-                                self.board_items[y][x].configure(bg=COLOURS["snake_head"], fg=COLOURS["snake_head"])
-                        elif place_text == "s":
-                            if COLOUR_BLIND_MODE:
-                                self.board_items[y][x].configure(bg=COLOURS_COLBLIND["snake_tail"],
-                                                                 fg=COLOURS_COLBLIND["snake_tail"])
-                            else:
-                                self.board_items[y][x].configure(bg=COLOURS["snake_tail"], fg=COLOURS["snake_tail"])
-                        elif place_text == "X":
-                            self.board_items[y][x].configure(bg=COLOURS["obstacle"], fg=COLOURS["obstacle"])
-                        elif place_text == "O":
-                            if COLOUR_BLIND_MODE:
-                                self.board_items[y][x].configure(bg=COLOURS_COLBLIND["snake_food"],
-                                                                 fg=COLOURS_COLBLIND["snake_food"])
-                            else:
-                                self.board_items[y][x].configure(bg=COLOURS["snake_food"], fg=COLOURS["snake_food"])
-                        else:
-                            self.board_items[y][x].configure(bg=COLOURS["background"], fg=COLOURS["background"])
-
-                        self.board_items[y][x].configure(text=place_text)
-        else:
-            pass
+            # Only the cells the game reports as changed need redrawing
+            for x, y in changed:
+                if 0 <= x < GAME.board.width and 0 <= y < GAME.board.height:
+                    self.draw_cell(x, y)
+            if GAME.profiler is not None:
+                GAME.profiler.record("render", perf_counter_ns() - start)
 
     def on_show(self):
         """Runs when this page is shown"""
-        self.setup_board()
+        # Don't try to catch up on the ticks that would have run while paused
+        if GAME.GameOn:
+            GAME.scheduler.start()
+
+        # Resuming from pause keeps the canvas, a new game or board size needs it set up again
+        if self.board_game != (GAME, GAME.board.width, GAME.board.height):
+            self.setup_board()
+        else:
+            if self.board_colour_blind != COLOUR_BLIND_MODE:
+                self.recolour_board()
+            self.board_update()
 
     def initialise(self):
         self.configure(bg=COLOURS["foreground"])
@@ -578,6 +666,13 @@ class PauseMenu(tk.Frame):
         tk.Button(self, text="Continue Playing", font=FONT_M, height=1, width=20, bg=COLOURS["button_good"],
                   command=lambda: controller.set_page(InProgress.page_name)).pack(side="top", pady=10)
 
+        # Save and resume buttons
+        tk.Button(self, text="Save Game", font=FONT_M, height=1, width=20, bg=COLOURS["button_default"],
+                  command=lambda: self.save_game()).pack(side="top", pady=10)
+
+        tk.Button(self, text="Load Saved Game", font=FONT_M, height=1, width=20, bg=COLOURS["button_default"],
+                  command=lambda: self.load_game()).pack(side="top", pady=10)
+
         # Restart button
         tk.Button(self, text="Restart Game", font=FONT_M, height=1, width=20, bg=COLOURS["button_bad"],
                   command=lambda: self.restart_game()).pack(side="top", pady=10)
@@ -586,15 +681,60 @@ class PauseMenu(tk.Frame):
         tk.Button(self, text="Quit", bg=COLOURS["button_bad"], height=1, width=20,
                   font=FONT_M, command=lambda: controller.destroy()).pack(side="top", pady=40)
 
+        # Tick timings, only when profiling
+        self.timings = tk.Label(self, text="", font=("Courier", 12), justify="left", bg=COLOURS["background"])
+        if PROFILE:
+            self.timings.pack(side="top", pady=10)
+            tk.Button(self, text="Export Timings", bg=COLOURS["button_default"], height=1, width=20,
+                      font=FONT_S, command=lambda: self.export_timings()).pack(side="top", pady=10)
+
     def restart_game(self):
         """Restart the game and return to the hope page"""
         restart_game()
 
         self.controller.set_page(Start.page_name)
 
+    def save_game(self):
+        """Write the paused game to the save file"""
+        try:
+            # Snapshot first, so a game that can't be saved leaves the old save alone
+            data = GAME.snapshot()
+            with open(SAVE_FILE, "wb") as file:
+                file.write(data)
+        except (OSError, ValueError) as e:
+            showerror("Error saving game", f"The game could not be saved to {SAVE_FILE}. ({e})")
+
+    def load_game(self):
+        """Replace the paused game with the one in the save file and carry on playing it"""
+        try:
+            with open(SAVE_FILE, "rb") as file:
+                GAME.restore(file.read())
+        except (OSError, ValueError, struct.error) as e:
+            showerror("Error loading game", f"The game could not be loaded from {SAVE_FILE}. ({e})")
+            return None
+
+        if GAME.GameOn:
+            # The board has to be drawn again from scratch
+            self.controller.Pages[InProgress.page_name].setup_board()
+            self.controller.set_page(InProgress.page_name)
+        else:
+            self.controller.set_page(EndGame.page_name)
+
+    def export_timings(self):
+        """Write the tick timings out as JSON"""
+        if GAME.profiler is None:
+            return None
+
+        try:
+            with open(PROFILE_FILE, "w") as file:
+                file.write(GAME.profiler.to_json())
+        except OSError as e:
+            showerror("Error exporting timings", f"The timings could not be written to {PROFILE_FILE}. ({e})")
+
     def on_show(self):
         """Runs when this page is shown"""
-        pass
+        if GAME.profiler is not None:
+            self.timings.configure(text=GAME.profiler.summary())
 
     def initialise(self):
         pass
@@ -608,8 +748,8 @@ class EndGame(tk.Frame):
 
         self.controller = controller
 
-        title = tk.Label(self, text="GAME OVER", font=FONT_L, bg=COLOURS["background"])
-        title.pack(side="top", pady=25, fill="x")
+        self.title = tk.Label(self, text="GAME OVER", font=FONT_L, bg=COLOURS["background"])
+        self.title.pack(side="top", pady=25, fill="x")
 
         score_frame = tk.Frame(self)
         score_frame.pack(side="top", pady=25)
@@ -621,6 +761,14 @@ class EndGame(tk.Frame):
         self.score_label = tk.Label(score_frame, text="", font=FONT_M, bg=COLOURS["background"])
         self.score_label.grid(row=0, column=1)
 
+        self.best_label = tk.Label(score_frame, text="", font=FONT_S, bg=COLOURS["background"])
+        self.best_label.grid(row=1, column=0, columnspan=2)
+
+        self.rank_label = tk.Label(score_frame, text="", font=FONT_S, bg=COLOURS["background"])
+        self.rank_label.grid(row=2, column=0, columnspan=2)
+
+        self.saved_game = None  # The GAME whose result was saved, so showing the page again doesn't save it twice
+
         # Restart Button
         tk.Button(self, text="Try Again", bg=COLOURS["button_good"], height=1, width=20,
                   font=FONT_S, command=lambda: self.restart_game()).pack(side="bottom", pady=10)
@@ -639,7 +787,40 @@ class EndGame(tk.Frame):
         """Sets up the page based on the data"""
         score = GAME.snake.level
 
+        if GAME.GameState == game.WON:
+            self.title.configure(text="YOU WIN")
+        else:
+            self.title.configure(text="GAME OVER")
+
         self.score_label.configure(text=str(score))
+        self.show_results()
+
+    def show_results(self):
+        """Save the result and show the personal best and rank on this board. The autopilot demo isn't saved"""
+        global RESULTS
+        self.best_label.configure(text="")
+        self.rank_label.configure(text="")
+        if GAME.policy is not None:
+            return None
+
+        board = GAME.board
+        board_key = results.board_key(board.width, board.height, GAME.board_wrapping,
+                                      board.level.name if board.level is not None else None)
+        try:
+            if RESULTS is None:
+                RESULTS = results.ResultsStore(batch_size=1)
+            if self.saved_game is not GAME:
+                RESULTS.add_game(GAME, PLAYER)
+                self.saved_game = GAME
+            best = RESULTS.personal_best(PLAYER, board_key)
+            rank = RESULTS.rank(board_key, GAME.snake.level)
+            games = RESULTS.games(board_key)
+        except sqlite3.Error as e:
+            showerror("Error saving result", f"The result could not be saved to {results.RESULTS_FILE}. ({e})")
+            return None
+
+        self.best_label.configure(text=f"Best: {best}")
+        self.rank_label.configure(text=f"Rank: {rank} of {games} on {board_key}")
 
     def on_show(self):
         """Runs when this page is shown"""
@@ -654,18 +835,21 @@ if __name__ == "__main__":
     win = Window()
 
     # Tie the game loop to the GUI mainloop.
-    # Should not affect game speed as it runs based off of its own independent time evaluations
+    # Should not affect game speed, the game's scheduler decides when a tick is due
+    # and the loop sleeps in the mainloop until then.
     def loop_tasks():
         global GAME
+        delay = IDLE_POLL_MS
         if win.CurrentPage == InProgress.page_name:
 
             if GAME.GameOn:
                 GAME.game_single_loop()
                 win.Pages["InProgress"].board_update()
-            if GAME.GameState == game.OVER:
+                delay = math.ceil(GAME.scheduler.time_until_next() * 1000)
+            if GAME.GameState in (game.OVER, game.WON):
                 win.set_page(EndGame.page_name)
         win.update_idletasks()
-        win.after(0, loop_tasks)
+        win.after(delay, loop_tasks)
 
 
     win.after(10, loop_tasks)
@@ -0,0 +1,262 @@
+import math
+import random
+
+import logic
+
+# Occupancy is one byte per cell and 0 means empty, so ids run 1 to 255
+MAX_SNAKES = 255
+
+
+class Arena:
+    """Several snakes on one board, all moving on the same tick.
+
+    Every cell of the board's occupancy holds the id of the snake on it (index + 1), so whatever a head moves into
+    is found with one lookup. Each tick is resolved in a single pass over the snakes:
+    tails move out first, then a head dies if it leaves a board that doesn't wrap, hits an obstacle, hits any body
+    (its own or another snake's, including a head that stayed put) or moves into the same cell as another head.
+    Heads that swap places die too, as each runs into the other's old head.
+    Dead snakes are cleared off the board. Food only goes to a head that reaches it alone.
+
+    controllers is a list of callables, one per snake, called as controller(arena, index) before each tick.
+    They return a direction, or None to carry on the same way. A None controller leaves the snake to be steered
+    with steer().
+
+    sparse picks the board type as in logic.new_board, very large arenas get a SparseBoard by default.
+    """
+
+    def __init__(self, snakes: int = 2, width: int = 30, height: int = 30, wrapping: bool = True,
+                 seed: int = None, controllers: list = None, sparse: bool = None, track_changes: bool = False):
+        if not 1 <= snakes <= MAX_SNAKES:
+            raise ValueError(f"An arena holds 1 to {MAX_SNAKES} snakes, not {snakes}")
+        if snakes > width * height:
+            raise ValueError(f"{snakes} snakes don't fit on a {width}x{height} board")
+
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = random.Random(seed)
+        self.seed = seed
+
+        self.board_wrapping = wrapping
+        self.board = logic.new_board(width, height, self.rng, sparse)
+        self.track_changes = track_changes  # See logic.Game
+
+        self.count = snakes
+        self.controllers = list(controllers) if controllers is not None else [None] * snakes
+        if len(self.controllers) != snakes:
+            raise ValueError(f"Expected {snakes} controllers, got {len(self.controllers)}")
+
+        self.reset(seed)
+
+    def spawn_points(self) -> list:
+        """Where each snake starts, spread over an even grid of the board"""
+        width, height = self.board.width, self.board.height
+        columns = math.ceil(math.sqrt(self.count * width / height))
+        columns = max(1, min(columns, width))
+        rows = math.ceil(self.count / columns)
+        if rows > height:
+            rows = height
+            columns = math.ceil(self.count / rows)
+
+        points = []
+        for i in range(self.count):
+            row, column = divmod(i, columns)
+            points.append(((column + 1) * width // (columns + 1), (row + 1) * height // (rows + 1)))
+        return points
+
+    def reset(self, seed: int = None) -> None:
+        """Start a new match on the same board. Without a seed the next one is drawn from the arena's rng"""
+        if seed is None:
+            seed = self.rng.getrandbits(64)
+        self.seed = seed
+        self.rng.seed(seed)
+
+        board = self.board
+        board.clear()
+
+        self.snakes = []
+        for i, (x, y) in enumerate(self.spawn_points()):
+            snake = logic.SnakeNode(x, y, is_head=True)
+            board.occupy(x, y, i + 1)
+            self.snakes.append(snake)
+        board.place_food()
+
+        self.alive = [True] * self.count
+        self.alive_count = self.count
+        self.death_tick = [None] * self.count
+        self.ticks = 0
+
+        self.GameOn = False
+        self.GameState = logic.OFF
+        self.winner = None  # Index of the last snake standing
+
+        # Cells (x, y) whose contents changed since the last pop_changed_cells call
+        self.changed_cells = set()
+
+    def start_game(self) -> None:
+        self.GameOn = True
+        self.GameState = logic.ON
+
+    def steer(self, index: int, direction) -> bool:
+        """Change the way a snake is heading, the same rules as SnakeNode.update_direction"""
+        return self.snakes[index].update_direction(direction)
+
+    def move_target(self, index: int, direction) -> tuple:
+        """The (x, y) a snake's head would move into going the given way, after wrapping.
+        None if that would leave a board that doesn't wrap"""
+        dx, dy = logic.MOVES[direction]
+        x, y = self.snakes[index].body[0]
+        x += dx
+        y += dy
+        width, height = self.board.width, self.board.height
+        if 0 <= x < width and 0 <= y < height:
+            return x, y
+        if not self.board_wrapping:
+            return None
+        return x % width, y % height
+
+    def is_safe_move(self, index: int, direction) -> bool:
+        """Check if a move avoids every wall, obstacle and body.
+        Other heads can still move into the same cell, which this doesn't know about"""
+        snake = self.snakes[index]
+        if direction == logic.OPPOSITE[snake.direction]:
+            return False
+        target = self.move_target(index, direction)
+        if target is None:
+            return False
+        x, y = target
+        board = self.board
+        if board.grid[y * board.width + x] == logic.OBSTA:
+            return False
+        owner = board.occupancy[y * board.width + x]
+        if owner:
+            # Only a tail that is about to move is safe
+            other = self.snakes[owner - 1]
+            return target == other.body[-1] and not other.increase_next_move
+        return True
+
+    def tick(self) -> bool:
+        """Advance every living snake by one tick. Returns False once the match is over"""
+        board = self.board
+        width, height = board.width, board.height
+        occupancy = board.occupancy
+        grid = board.grid
+        changed = self.changed_cells if self.track_changes else None
+        snakes = self.snakes
+        alive = self.alive
+        wrapping = self.board_wrapping
+        moves = logic.MOVES
+
+        # Controllers all see the board as it was at the end of the last tick
+        for i, controller in enumerate(self.controllers):
+            if controller is not None and alive[i]:
+                direction = controller(self, i)
+                if direction is not None:
+                    snakes[i].update_direction(direction)
+
+        # Where each head is going, and how many heads are going there
+        targets = [None] * self.count
+        heads_at = {}
+        heads = {}  # Cell of each head before it moves -> snake index
+        for i, snake in enumerate(snakes):
+            if not alive[i]:
+                continue
+            snake.cement_direction()
+            dx, dy = moves[snake.direction]
+            x, y = snake.body[0]
+            heads[y * width + x] = i
+            x += dx
+            y += dy
+            if not (0 <= x < width and 0 <= y < height):
+                if not wrapping:
+                    targets[i] = False  # Off the edge
+                    continue
+                x %= width
+                y %= height
+            cell = y * width + x
+            targets[i] = cell
+            heads_at[cell] = heads_at.get(cell, 0) + 1
+
+            # Tails move out of the way first, so any head can follow a tail
+            if not snake.increase_next_move:
+                tail_x, tail_y = snake.body[-1]
+                board.release(tail_x, tail_y)
+                if changed is not None:
+                    changed.add((tail_x, tail_y))
+
+        # Decide who dies before anything moves, so the order snakes are handled in doesn't matter
+        dying = []
+        for i, cell in enumerate(targets):
+            if cell is None:
+                continue
+            if cell is False or heads_at[cell] > 1 or occupancy[cell]:
+                dying.append(i)
+                continue
+            # Two heads swapping places. Longer snakes already hit the other's head, this catches single cells
+            other = heads.get(cell)
+            if other is not None and other != i:
+                head_x, head_y = snakes[i].body[0]
+                if targets[other] == head_y * width + head_x:
+                    dying.append(i)
+                    continue
+            if grid[cell] == logic.OBSTA:
+                dying.append(i)
+
+        for i in dying:
+            snake = snakes[i]
+            alive[i] = False
+            targets[i] = None
+            self.death_tick[i] = self.ticks
+            self.alive_count -= 1
+            # Clear the body, leaving any cell that now belongs to someone else
+            owner = i + 1
+            for x, y in snake.body:
+                cell = y * width + x
+                if occupancy[cell] == owner:
+                    board.release(x, y)
+                if changed is not None:
+                    changed.add((x, y))
+
+        # Move the survivors
+        food_eaten = False
+        food_pos = board.food_pos
+        for i, cell in enumerate(targets):
+            if cell is None:
+                continue
+            snake = snakes[i]
+            y, x = divmod(cell, width)
+            snake.set_position(x, y)
+            board.occupy(x, y, i + 1)
+            if changed is not None:
+                changed.add((x, y))
+            if grid[cell] == logic.FOOD:
+                snake.level_up()
+                food_eaten = True
+
+        self.ticks += 1
+
+        if food_eaten:
+            if not board.food_ate():
+                self.GameState = logic.WON
+            elif board.food_pos is not food_pos and changed is not None:
+                changed.add(tuple(board.food_pos))
+
+        # The match ends with one snake left, or none for a single snake
+        if self.alive_count <= (1 if self.count > 1 else 0) or self.GameState == logic.WON:
+            self.GameOn = False
+            if self.alive_count == 1:
+                self.winner = alive.index(True)
+            if self.GameState != logic.WON:
+                self.GameState = logic.OVER
+            return False
+        return True
+
+    def pop_changed_cells(self) -> set:
+        """Get every cell that changed since this was last called, and start collecting again"""
+        changed = self.changed_cells
+        self.changed_cells = set()
+        return changed
+
+    def scores(self) -> list:
+        """(length, ticks survived) for each snake"""
+        return [(len(snake.body), self.ticks if self.death_tick[i] is None else self.death_tick[i])
+                for i, snake in enumerate(self.snakes)]
@@ -0,0 +1,371 @@
+import heapq
+from collections import deque
+
+import logic
+
+# Distance of a cell food can't be reached from
+UNREACHABLE = 1 << 30
+
+# Most queued entries the distance map works through in one call, what is left over carries on in the next call
+WORK_BUDGET = 200
+
+
+class Autopilot:
+    """Steers a logic.Game's snake, for use as a policy (see farm.py) or as Game.policy.
+
+    Each tick it takes the shortest path it knows of to the food, as long as the snake could still reach its own tail
+    once it has eaten. Otherwise it plays for time: a move that keeps the tail reachable, heading away from it,
+    and failing that the move with the most room.
+
+    Distances to the food are kept in a map that is updated as the snake moves rather than rebuilt:
+    the cell the head moves into is blocked and only the distances that went through it are cleared,
+    and the cell the tail leaves is opened up. Filling distances in, or lowering them, is queued and done
+    a bounded amount per call, nearest the head first, so no single decision pays for the whole board.
+    Until the queue is empty a distance may be longer than the shortest path, but it is always the length of a
+    real path: every cell with a distance has a neighbour nearer the food.
+    The map is only started again when the food moves or the game jumps, e.g. a new game.
+    """
+
+    def __init__(self):
+        self.game = None
+        self.distance = None  # Steps from each cell to the food, y * width + x
+        self.neighbours = None  # Cells next to each cell, after wrapping
+        self.pending = []  # Heap of (priority, -distance, cell) still to be settled
+        self.size = None
+        self.food = None
+        self.head = None
+        self.tail = None
+        self.plan = deque()  # Cells still to go through on a route to the food already checked to be safe
+
+    def reset(self, seed: int = None) -> None:
+        """Forget the tracked game, the next call rebuilds everything"""
+        self.game = None
+
+    def __call__(self, game: logic.Game):
+        if not game.snake.body:
+            return None
+        self.track(game)
+        self.work(WORK_BUDGET)
+        return self.choose(game)
+
+    # Distance map
+
+    def build_neighbours(self, game: logic.Game) -> None:
+        width, height = game.board.width, game.board.height
+        wrapping = game.board_wrapping
+        neighbours = []
+        for y in range(height):
+            for x in range(width):
+                cells = []
+                for dx, dy in ((0, -1), (0, 1), (1, 0), (-1, 0)):
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < width and 0 <= ny < height):
+                        if not wrapping:
+                            continue
+                        nx %= width
+                        ny %= height
+                    cells.append(ny * width + nx)
+                neighbours.append(tuple(cells))
+        self.neighbours = neighbours
+        self.size = (width, height, wrapping)
+
+    def blocked(self, cell: int) -> bool:
+        board = self.game.board
+        return board.occupancy[cell] != 0 or board.grid[cell] == logic.OBSTA
+
+    def track(self, game: logic.Game) -> None:
+        """Bring the distance map up to date with the game"""
+        board = game.board
+        snake = game.snake
+        width = board.width
+        head = snake.body[0][1] * width + snake.body[0][0]
+        tail = snake.body[-1][1] * width + snake.body[-1][0]
+        food = board.food_pos[1] * width + board.food_pos[0] if board.food_pos else None
+
+        if game is not self.game or self.size != (width, board.height, game.board_wrapping) or food != self.food:
+            self.rebuild(game, head, tail, food)
+            return None
+
+        if head == self.head:
+            return None  # No tick since the last call
+
+        if len(snake.body) > 1:
+            second = snake.body[1][1] * width + snake.body[1][0]
+        else:
+            second = tail
+        if second != self.head or (tail != self.tail and board.occupancy[self.tail] and self.tail != head):
+            self.rebuild(game, head, tail, food)
+            return None
+
+        # One tick: the head moved into one cell and the tail left another, unless the head followed it in.
+        # When the snake grew the tail stayed put and only the head's cell changed
+        if head != self.tail:
+            self.block(head)
+            if tail != self.tail:
+                self.unblock(self.tail)
+        self.head = head
+        self.tail = tail
+
+    def rebuild(self, game: logic.Game, head: int, tail: int, food) -> None:
+        """Clear every distance and start again from the food, the search is done by work()"""
+        self.game = game
+        if self.size != (game.board.width, game.board.height, game.board_wrapping):
+            self.build_neighbours(game)
+        self.head = head
+        self.tail = tail
+        self.food = food
+        self.plan.clear()
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget every distance and queue the food to search out from again"""
+        self.distance = [UNREACHABLE] * len(self.neighbours)
+        self.pending = []
+        if self.food is not None:
+            self.queue(self.food, 0)
+
+    def block(self, cell: int) -> None:
+        """A cell has been filled. Clear every distance that relied on it and queue them to be filled in again
+        from the cells around them that still have a way to the food"""
+        distance = self.distance
+        neighbours = self.neighbours
+        if distance[cell] == UNREACHABLE:
+            return None
+
+        # A cell is lost once no neighbour is left nearer the food. Going out nearest first, a cell is checked
+        # again each time one of its nearer neighbours is lost, the last of those checks has them all marked
+        heap = [(distance[cell], cell)]
+        distance[cell] = UNREACHABLE
+        lost = []
+        while heap:
+            d, current = heapq.heappop(heap)
+            for other in neighbours[current]:
+                other_distance = distance[other]
+                if d < other_distance != UNREACHABLE and not self._supported(other, other_distance):
+                    distance[other] = UNREACHABLE
+                    lost.append(other)
+                    heapq.heappush(heap, (other_distance, other))
+            if len(lost) > WORK_BUDGET:
+                # Most of the map went through this cell, searching again from the food costs less
+                self.clear()
+                return None
+
+        for current in lost:
+            best = min(distance[other] for other in neighbours[current])
+            if best != UNREACHABLE:
+                self.queue(current, best + 1)
+
+    def _supported(self, cell: int, d: int) -> bool:
+        """Check if a cell still has a neighbour nearer the food"""
+        distance = self.distance
+        for other in self.neighbours[cell]:
+            if distance[other] < d:
+                return True
+        return False
+
+    def unblock(self, cell: int) -> None:
+        """A cell has been emptied, queue any shorter paths through it"""
+        if self.blocked(cell):
+            return None
+        best = min(self.distance[other] for other in self.neighbours[cell])
+        if best != UNREACHABLE and best + 1 < self.distance[cell]:
+            self.queue(cell, best + 1)
+
+    def queue(self, cell: int, d: int) -> None:
+        """Queue a cell to be given distance d. Cells are settled in order of d plus how far they are from the head
+        as the crow flies, ties going to the cell furthest from the food, so the search heads for the snake"""
+        width, height, wrapping = self.size
+        y, x = divmod(cell, width)
+        head_y, head_x = divmod(self.head, width)
+        dx = abs(x - head_x)
+        dy = abs(y - head_y)
+        if wrapping:
+            dx = min(dx, width - dx)
+            dy = min(dy, height - dy)
+        heapq.heappush(self.pending, (d + dx + dy, -d, cell))
+
+    def work(self, budget: int = None) -> None:
+        """Settle queued distances and spread them outwards.
+        With a budget, stop after that many entries or once nothing queued could give the head a shorter way,
+        the rest is left for later calls. Without one, settle everything.
+        An entry whose neighbour it came through has been lost since is queued again further out"""
+        distance = self.distance
+        neighbours = self.neighbours
+        around_head = neighbours[self.head] if budget is not None else ()
+        goal = min((distance[other] for other in around_head), default=UNREACHABLE) + 1
+        occupancy = self.game.board.occupancy
+        grid = self.game.board.grid
+        obstacle = logic.OBSTA
+        pending = self.pending
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        width, height, wrapping = self.size
+        head_y, head_x = divmod(self.head, width)
+        while pending and budget != 0 and pending[0][0] < goal:
+            _, d, cell = heappop(pending)
+            d = -d
+            if budget is not None:
+                budget -= 1
+            if d >= distance[cell] or occupancy[cell] or grid[cell] == obstacle:
+                continue
+            if d:
+                best = min(distance[other] for other in neighbours[cell])
+                if best >= d:
+                    # Where this came from has been lost since, queue it again from the best neighbour it has now
+                    if best != UNREACHABLE and best + 1 < distance[cell]:
+                        self.queue(cell, best + 1)
+                    continue
+            distance[cell] = d
+            if cell in around_head:
+                goal = min(goal, d + 1)
+            d += 1
+            for other in neighbours[cell]:
+                if d < distance[other] and not occupancy[other] and grid[other] != obstacle:
+                    # Same as queue(), worked out here as this is where most of the time goes
+                    y, x = divmod(other, width)
+                    dx = abs(x - head_x)
+                    dy = abs(y - head_y)
+                    if wrapping:
+                        dx = min(dx, width - dx)
+                        dy = min(dy, height - dy)
+                    heappush(pending, (d + dx + dy, -d, other))
+
+    # Decisions
+
+    def choose(self, game: logic.Game):
+        """Pick the direction for the next tick"""
+        width = game.board.width
+        moves = {}
+        for direction in logic.DIRECTIONS:
+            if game.is_safe_move(direction):
+                x, y = game.move_target(direction)
+                moves[direction] = y * width + x
+        if not moves:
+            return None
+
+        # Carry on along a route that has already been checked
+        plan = self.plan
+        if plan:
+            for direction, cell in moves.items():
+                if cell == plan[0]:
+                    plan.popleft()
+                    return direction
+            plan.clear()
+
+        # Straight for the food if the snake can still get to its tail after eating it.
+        # Following the route doesn't change where the snake ends up, so it only needs checking once
+        path = self.food_path(moves)
+        if path is not None and self.tail_reachable(game, path, grows=True):
+            plan.extend(path[2:])
+            return path[0]
+
+        # Otherwise stall: a move that keeps the tail in reach, as far from the tail as possible.
+        # Moves are tried furthest first so usually only one needs checking
+        tail_x, tail_y = game.snake.body[-1]
+
+        def from_tail(direction):
+            y, x = divmod(moves[direction], width)
+            return self.wrapped_distance(game, x, y, tail_x, tail_y)
+
+        for direction in sorted(moves, key=from_tail, reverse=True):
+            if self.tail_reachable(game, [direction, moves[direction]], grows=False):
+                return direction
+
+        # Nothing keeps the tail in reach, go where there is most room
+        return max(moves, key=lambda direction: self.room(game, moves[direction], len(game.snake.body)))
+
+    def food_path(self, moves: dict):
+        """The route to the food down the distance map as [first direction, cell, cell, ...] ending on the food.
+        None if the food can't be reached"""
+        distance = self.distance
+        first = min(moves, key=lambda direction: distance[moves[direction]], default=None)
+        if first is None or distance[moves[first]] == UNREACHABLE:
+            return None
+
+        path = [first, moves[first]]
+        cell = moves[first]
+        while distance[cell] > 0:
+            cell = min(self.neighbours[cell], key=distance.__getitem__)
+            path.append(cell)
+        return path
+
+    def tail_reachable(self, game: logic.Game, path: list, grows: bool) -> bool:
+        """Check if, after following path ([first direction, cells...]), the head could still get to the tail.
+        Works on a copy of the occupancy, moving the body along the path.
+        Room for as many cells as the snake is long counts too, the tail will have moved off by the time it is used"""
+        board = game.board
+        width = board.width
+        body = game.snake.body
+        cells = path[1:]
+        length = len(body) + (1 if grows or game.snake.increase_next_move else 0)
+        if length <= 2:
+            return True
+
+        # Where the body is after the moves: the path (newest first) then what is left of the old body
+        new_body = cells[:-length - 1:-1]
+        for x, y in body:
+            if len(new_body) >= length:
+                break
+            new_body.append(y * width + x)
+        head = new_body[0]
+        tail = new_body[-1]
+
+        occupied = bytearray(board.occupancy)
+        for x, y in body:
+            occupied[y * width + x] = 0
+        for cell in new_body:
+            occupied[cell] = 1
+        occupied[tail] = 0
+        grid = board.grid
+        neighbours = self.neighbours
+
+        # Any route will do, so search out from the head towards the tail first and stop as soon as it is found.
+        # On an open board that only looks at the cells along the way
+        tail_y, tail_x = divmod(tail, width)
+        height = board.height
+        wrapping = game.board_wrapping
+        seen = bytearray(len(occupied))
+        seen[head] = 1
+        room = 0
+        heap = [(0, head)]
+        while heap:
+            cell = heapq.heappop(heap)[1]
+            for other in neighbours[cell]:
+                if other == tail:
+                    return True
+                if not seen[other] and not occupied[other] and grid[other] != logic.OBSTA:
+                    seen[other] = 1
+                    room += 1
+                    if room >= 2 * length:
+                        return True
+                    y, x = divmod(other, width)
+                    dx = abs(x - tail_x)
+                    dy = abs(y - tail_y)
+                    if wrapping:
+                        dx = min(dx, width - dx)
+                        dy = min(dy, height - dy)
+                    heapq.heappush(heap, (dx + dy, other))
+        return False
+
+    def room(self, game: logic.Game, start: int, limit: int) -> int:
+        """Count the empty cells reachable from start, stopping at limit"""
+        board = game.board
+        neighbours = self.neighbours
+        seen = {start}
+        queue = deque([start])
+        while queue and len(seen) < limit:
+            cell = queue.popleft()
+            for other in neighbours[cell]:
+                if other not in seen and not board.occupancy[other] and board.grid[other] != logic.OBSTA:
+                    seen.add(other)
+                    queue.append(other)
+        return len(seen)
+
+    @staticmethod
+    def wrapped_distance(game: logic.Game, x1: int, y1: int, x2: int, y2: int) -> int:
+        dx = abs(x1 - x2)
+        dy = abs(y1 - y2)
+        if game.board_wrapping:
+            dx = min(dx, game.board.width - dx)
+            dy = min(dy, game.board.height - dy)
+        return dx + dy
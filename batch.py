@@ -0,0 +1,205 @@
+import random
+
+import numpy as np
+
+import env
+import logic
+
+# Direction indexes used by the batch engine. Opposite directions differ only in the lowest bit.
+DIRECTION_INDEX = {d: i for i, d in enumerate(logic.DIRECTIONS)}
+NO_INPUT = -1
+
+# Movement per direction index, same as SnakeNode.update_position
+_DX = np.array([logic.MOVES[d][0] for d in logic.DIRECTIONS], dtype=np.int64)
+_DY = np.array([logic.MOVES[d][1] for d in logic.DIRECTIONS], dtype=np.int64)
+
+# Rewards handed back from step(), the same as SnakeEnv's
+REWARD_FOOD = env.REWARD_FOOD
+REWARD_DEATH = env.REWARD_DEATH
+
+
+def encode_directions(directions) -> np.ndarray:
+    """Convert a sequence of logic direction constants (or None for no input) into an index array"""
+    return np.array([NO_INPUT if d is None else DIRECTION_INDEX[d] for d in directions], dtype=np.int64)
+
+
+class BatchGame:
+    """Steps many boards of the same size in lockstep.
+
+    Each board follows the same rules as logic.Game.tick, and given the same seed places its food
+    exactly where logic.Game(seed=seed) would.
+    Snake bodies are kept as ring buffers of cell indexes (y * width + x), one row per board.
+    """
+
+    def __init__(self, n: int, width: int = 30, height: int = 30, wrapping: bool = True, seeds=None):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.board_wrapping = wrapping
+
+        # Per board state
+        self.body = np.zeros((n, self.cells), dtype=np.int32)  # Ring buffer of cells, head at head_ptr
+        self.occupied = np.zeros((n, self.cells), dtype=np.bool_)  # Cells covered by the snake
+        # Free cell index, kept in the same order as Board.free_cells so food lands in the same place
+        self.free = np.zeros((n, self.cells), dtype=np.int32)
+        self.free_slot = np.zeros((n, self.cells), dtype=np.int32)  # -1 for occupied cells
+        self.free_count = np.zeros(n, dtype=np.int64)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.head_x = np.zeros(n, dtype=np.int64)
+        self.head_y = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.grow = np.zeros(n, dtype=np.bool_)  # Grow on the next move, like SnakeNode.increase_next_move
+        self.level = np.zeros(n, dtype=np.int64)
+        self.food = np.zeros(n, dtype=np.int64)
+        self.done = np.zeros(n, dtype=np.bool_)
+        self.won = np.zeros(n, dtype=np.bool_)  # Finished by filling the board, see logic.WON
+        self.ticks = np.zeros(n, dtype=np.int64)
+
+        self.rngs = [random.Random() for _ in range(n)]
+
+        self.reset(seeds=seeds)
+
+    def reset(self, indexes=None, seeds=None) -> None:
+        """Start fresh games on the given boards (all boards if None)"""
+        if indexes is None:
+            indexes = np.arange(self.n)
+        else:
+            indexes = np.asarray(indexes, dtype=np.int64)
+
+        if seeds is None:
+            seeds = [None] * len(indexes)
+
+        self.occupied[indexes] = False
+        self.free[indexes] = np.arange(self.cells, dtype=np.int32)
+        self.free_slot[indexes] = np.arange(self.cells, dtype=np.int32)
+        self.free_count[indexes] = self.cells
+        self.head_ptr[indexes] = 0
+        self.length[indexes] = 1
+        self.head_x[indexes] = int(self.width / 2)
+        self.head_y[indexes] = int(self.height / 2)
+        self.direction[indexes] = DIRECTION_INDEX[logic.E]
+        self.grow[indexes] = False
+        self.level[indexes] = 1
+        self.done[indexes] = False
+        self.won[indexes] = False
+        self.ticks[indexes] = 0
+
+        for i, seed in zip(indexes.tolist(), seeds):
+            self.rngs[i].seed(seed)
+            # Game places the first food before the snake exists
+            self.place_food(i)
+
+        start = self.head_y[indexes] * self.width + self.head_x[indexes]
+        self.body[indexes, 0] = start
+        self._occupy(indexes, start)
+
+    def _occupy(self, idx, cells) -> None:
+        """Swap-remove one cell per board from the free index, like Board.occupy"""
+        slot = self.free_slot[idx, cells]
+        last = self.free[idx, self.free_count[idx] - 1]
+        self.free[idx, slot] = last
+        self.free_slot[idx, last] = slot
+        self.free_slot[idx, cells] = -1
+        self.free_count[idx] -= 1
+        self.occupied[idx, cells] = True
+
+    def _release(self, idx, cells) -> None:
+        """Append one cell per board to the free index, like Board.release"""
+        count = self.free_count[idx]
+        self.free[idx, count] = cells
+        self.free_slot[idx, cells] = count
+        self.free_count[idx] += 1
+        self.occupied[idx, cells] = False
+
+    def place_food(self, i: int) -> bool:
+        """Place food on board i the same way Board.place_food does. Returns False if the board is full"""
+        count = int(self.free_count[i])
+        if count == 0:
+            return False
+
+        self.food[i] = self.free[i, self.rngs[i].randrange(count)]
+        return True
+
+    def step(self, directions):
+        """Run one tick on every board that is still in play.
+
+        directions holds one direction index per board, or NO_INPUT to keep going the same way.
+        Returns (rewards, ate, done) arrays. Finished boards keep their last state until reset.
+        """
+        directions = np.asarray(directions, dtype=np.int64)
+        rewards = np.zeros(self.n, dtype=np.float32)
+        ate = np.zeros(self.n, dtype=np.bool_)
+
+        idx = np.flatnonzero(~self.done)
+        if len(idx) == 0:
+            return rewards, ate, self.done.copy()
+
+        # Turning back on yourself is ignored, same as SnakeNode.update_direction
+        cur = self.direction[idx]
+        d = directions[idx]
+        d = np.where((d >= 0) & (d != (cur ^ 1)), d, cur)
+        self.direction[idx] = d
+
+        x = self.head_x[idx] + _DX[d]
+        y = self.head_y[idx] + _DY[d]
+        if self.board_wrapping:
+            x %= self.width
+            y %= self.height
+            dead = np.zeros(len(idx), dtype=np.bool_)
+        else:
+            dead = (x < 0) | (x >= self.width) | (y < 0) | (y >= self.height)
+            x = np.clip(x, 0, self.width - 1)
+            y = np.clip(y, 0, self.height - 1)
+        cell = y * self.width + x
+
+        # The tail moves out of its cell on the same tick, unless the snake is growing
+        grow = self.grow[idx]
+        tail = self.body[idx, (self.head_ptr[idx] - self.length[idx] + 1) % self.cells]
+        dead |= self.occupied[idx, cell] & ~((cell == tail) & ~grow)
+
+        rewards[idx[dead]] = REWARD_DEATH
+        self.done[idx[dead]] = True
+
+        # Move the survivors
+        alive = ~dead
+        idx, cell, grow, tail = idx[alive], cell[alive], grow[alive], tail[alive]
+        x, y = x[alive], y[alive]
+
+        self._release(idx[~grow], tail[~grow])
+        self.length[idx[grow]] += 1
+        self.grow[idx] = False
+
+        ptr = (self.head_ptr[idx] + 1) % self.cells
+        self.head_ptr[idx] = ptr
+        self.body[idx, ptr] = cell
+        self._occupy(idx, cell)
+        self.head_x[idx] = x
+        self.head_y[idx] = y
+        self.ticks[idx] += 1
+
+        # Food
+        eaters = idx[cell == self.food[idx]]
+        ate[eaters] = True
+        rewards[eaters] = REWARD_FOOD
+        self.grow[eaters] = True
+        self.level[eaters] += 1
+        for i in eaters.tolist():
+            if not self.place_food(i):
+                # Nowhere left to put food, the board is won
+                self.done[i] = True
+                self.won[i] = True
+
+        return rewards, ate, self.done.copy()
+
+    def snake_positions(self, i: int) -> list:
+        """List the (x, y) of each snake node on board i, head first"""
+        ptr = int(self.head_ptr[i])
+        cells = [int(self.body[i, (ptr - k) % self.cells]) for k in range(int(self.length[i]))]
+        return [(c % self.width, c // self.width) for c in cells]
+
+    def food_position(self, i: int) -> list:
+        """The [x, y] of the food on board i"""
+        food = int(self.food[i])
+        return [food % self.width, food // self.width]
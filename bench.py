@@ -0,0 +1,357 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+from collections import deque
+from contextlib import redirect_stdout
+from time import perf_counter, strftime
+
+import arena
+import codec
+import farm
+import logic
+import server
+
+logic.DEBUG_TEXT = False
+
+# Board sizes and the snake lengths run on each for the tick benchmark
+TICK_CASES = [(10, 3), (10, 50),
+              (50, 3), (50, 1000),
+              (100, 3), (100, 5000),
+              (500, 3), (500, 100000)]
+FOOD_SIZES = (30, 100, 500)
+FOOD_FILLS = (0.0, 0.5, 0.9, 0.99)
+PRINT_SIZES = (30, 100)
+GUI_CASES = [(30, 3), (30, 400), (100, 3), (100, 5000)]
+ARENA_CASES = [(50, 4), (200, 16), (500, 64)]
+FORK_CASES = [(30, 50), (100, 2000), (1000, 3)]
+ROLLOUT_SIZES = (30, 1000)
+ROLLOUT_DEPTH = 20
+ROLLOUT_FUTURES = 20  # Per rollout call, the first fork copies the board and the rest catch up
+SERVER_SESSIONS = (100, 1000)
+
+# Each measurement keeps the best of this many runs
+REPEATS = 5
+
+# How much worse than the baseline a result may be before it counts as a regression
+DEFAULT_TOLERANCE = 0.15
+
+
+def rate(step, min_time: float, repeats: int = REPEATS) -> float:
+    """Call step() for min_time seconds in total and return calls per second.
+    The time is split over a few repeats and the best one is kept, which is the least disturbed by noise"""
+    best = 0.0
+    for _ in range(repeats):
+        count = 0
+        start = perf_counter()
+        while True:
+            for _ in range(50):
+                step()
+            count += 50
+            elapsed = perf_counter() - start
+            if elapsed >= min_time / repeats:
+                break
+        best = max(best, count / elapsed)
+    return best
+
+
+def cycle_path(width: int, height: int) -> list:
+    """A loop through every cell of a board with an even height, as a list of (x, y).
+    A snake following it never runs into itself"""
+    path = []
+    for y in range(height):
+        xs = range(1, width) if y % 2 == 0 else range(width - 1, 0, -1)
+        path.extend((x, y) for x in xs)
+    path.extend((0, y) for y in range(height - 1, -1, -1))
+    return path
+
+
+def looping_game(width: int, height: int, length: int, wrapping: bool = True):
+    """A game with a snake of the given length following cycle_path, with no food to change its length.
+    Returns the game and a dict of which way to go from each cell"""
+    game = logic.Game(width=width, height=height, wrapping=wrapping, seed=0, record=False)
+    path = cycle_path(width, height)
+    next_direction = {}
+    for i, (x, y) in enumerate(path):
+        nx, ny = path[(i + 1) % len(path)]
+        for direction, (dx, dy) in logic.MOVES.items():
+            if (x + dx, y + dy) == (nx, ny):
+                next_direction[(x, y)] = direction
+
+    board = game.board
+    board.clear()
+    board.food_pos = []
+    body = path[:length]
+    body.reverse()  # Head first
+    for x, y in body:
+        board.occupy(x, y)
+    game.snake.body = deque(body)
+    game.snake.direction = next_direction[body[1]] if length > 1 else logic.E
+    game.start_game()
+    return game, next_direction
+
+
+def bench_tick(min_time: float) -> dict:
+    results = {}
+    for size, length in TICK_CASES:
+        game, next_direction = looping_game(size, size, length)
+        snake = game.snake
+
+        def step():
+            snake.update_direction(next_direction[snake.body[0]])
+            game.tick()
+
+        results[f"tick/{size}x{size}/len{length}"] = (rate(step, min_time), "ticks/s", True)
+    return results
+
+
+def bench_place_food(min_time: float) -> dict:
+    results = {}
+    for size in FOOD_SIZES:
+        for fill in FOOD_FILLS:
+            game = logic.Game(width=size, height=size, seed=0, record=False)
+            board = game.board
+            board.clear()
+            cells = list(range(size * size))
+            random.Random(size).shuffle(cells)
+            for cell in cells[:int(len(cells) * fill)]:
+                board.occupy(cell % size, cell // size)
+
+            def step():
+                board.place_food()
+                board.grid[board.food_pos[1] * size + board.food_pos[0]] = logic.AVAIL
+
+            per_second = rate(step, min_time)
+            results[f"place_food/{size}x{size}/fill{int(fill * 100)}"] = (1e6 / per_second, "us", False)
+    return results
+
+
+def bench_collision(min_time: float) -> dict:
+    results = {}
+    for wrapping in (False, True):
+        game, _ = looping_game(100, 100, 3, wrapping=wrapping)
+        board = game.board
+        snake = game.snake
+        # Start just off the board so the wrapping case has to wrap
+        start = (100, 50) if wrapping else (50, 50)
+
+        def step():
+            snake.body[0] = start
+            game.collision_detection()
+            board.release(snake.X, snake.Y)
+
+        name = "collision/wrap" if wrapping else "collision/no_wrap"
+        results[name] = (1e6 / rate(step, min_time), "us", False)
+    return results
+
+
+def bench_arena(min_time: float) -> dict:
+    results = {}
+    for size, snakes in ARENA_CASES:
+        match = arena.Arena(snakes, size, size, seed=0)
+        match.start_game()
+
+        def step():
+            if not match.tick():
+                match.reset()
+                match.start_game()
+
+        results[f"arena/{size}x{size}/snakes{snakes}"] = (rate(step, min_time), "ticks/s", True)
+    return results
+
+
+def bench_fork(min_time: float) -> dict:
+    results = {}
+    for size, length in FORK_CASES:
+        game, _ = looping_game(size, size, length)
+        scratch = [None]
+
+        def step():
+            scratch[0] = game.fork(into=scratch[0])
+
+        results[f"fork/{size}x{size}/len{length}"] = (1e6 / rate(step, min_time), "us", False)
+
+    policy = farm.GreedyPolicy()
+    for size in ROLLOUT_SIZES:
+        game = logic.Game(width=size, height=size, seed=0, record=False)
+        game.start_game()
+        calls = rate(lambda: game.rollout(policy, ROLLOUT_DEPTH, ROLLOUT_FUTURES, seed=0), min_time)
+        results[f"rollout/{size}x{size}/depth{ROLLOUT_DEPTH}"] = (calls * ROLLOUT_FUTURES, "rollouts/s", True)
+    return results
+
+
+def bench_codec(min_time: float) -> dict:
+    """Encoder.tick cost on a game that is already running, and the bytes it writes per tick"""
+    results = {}
+    for size, length in TICK_CASES[2:4]:
+        game, next_direction = looping_game(size, size, length)
+        encoder = codec.Encoder(game)
+        snake = game.snake
+        written = [0, 0]
+
+        def step():
+            snake.update_direction(next_direction[snake.body[0]])
+            game.tick()
+            encoder.tick()
+            written[0] += len(encoder.out)
+            written[1] += 1
+            encoder.out.clear()
+
+        results[f"encode/{size}x{size}/len{length}"] = (rate(step, min_time), "ticks/s", True)
+        results[f"encode_size/{size}x{size}/len{length}"] = (written[0] / written[1], "bytes/tick", False)
+    return results
+
+
+def bench_server(min_time: float) -> dict:
+    """GameServer.step cost, ticking every session and encoding its delta. Frames go nowhere"""
+    class Sink:
+        def send(self, frame):
+            pass
+
+    results = {}
+    for sessions in SERVER_SESSIONS:
+        game_server = server.GameServer()
+        for _ in range(sessions):
+            game_server.new_session().clients.append(Sink())
+        results[f"server_step/sessions{sessions}"] = (1e3 / rate(game_server.step, min_time, repeats=2), "ms", False)
+    return results
+
+
+def bench_print_board(min_time: float) -> dict:
+    results = {}
+    for size in PRINT_SIZES:
+        game, next_direction = looping_game(size, size, size * 2)
+        buffer = io.StringIO()
+
+        def step():
+            game.snake.update_direction(next_direction[game.snake.body[0]])
+            game.tick()
+            buffer.seek(0)
+            buffer.truncate()
+            with redirect_stdout(buffer):
+                game.print_board()
+
+        results[f"print_board/{size}x{size}"] = (1e3 / rate(step, min_time), "ms/frame", False)
+    return results
+
+
+def bench_gui(min_time: float) -> dict:
+    """InProgress.board_update cost per frame. Needs a display, e.g. run under xvfb-run"""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {"skipped": f"GUI benchmarks need a display ({e})"}
+
+    try:
+        import GUI
+    except Exception as e:
+        root.destroy()
+        return {"skipped": f"GUI could not be imported ({e})"}
+
+    results = {}
+    try:
+        for size, length in GUI_CASES:
+            game, next_direction = looping_game(size, size, length)
+            game.track_changes = True
+            GUI.GAME = game
+            page = GUI.InProgress(root, None)
+            page.pack()
+            page.setup_board()
+            root.update()
+
+            def step():
+                game.snake.update_direction(next_direction[game.snake.body[0]])
+                game.tick()
+                page.board_update()
+                root.update_idletasks()
+
+            results[f"board_update/{size}x{size}/len{length}"] = (1e3 / rate(step, min_time), "ms/frame", False)
+            page.destroy()
+    finally:
+        root.destroy()
+    return results
+
+
+BENCHMARKS = {"tick": bench_tick,
+              "place_food": bench_place_food,
+              "collision": bench_collision,
+              "arena": bench_arena,
+              "fork": bench_fork,
+              "codec": bench_codec,
+              "server": bench_server,
+              "print_board": bench_print_board,
+              "gui": bench_gui}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Compare results against a baseline. Returns a list of (name, old, new, change, regressed)"""
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["value"]
+        new = result["value"]
+        if old == 0:
+            continue
+        change = (new - old) / old
+        if result["higher_is_better"]:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+        rows.append((name, old, new, change, regressed))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Only run these groups")
+    parser.add_argument("--min-time", type=float, default=0.3, help="Seconds to spend on each measurement")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against results previously written with --json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Fraction worse than the baseline that counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    skipped = {}
+    for group in args.only or list(BENCHMARKS):
+        for name, value in BENCHMARKS[group](args.min_time).items():
+            if name == "skipped":
+                skipped[group] = value
+                print(f"{group}: skipped, {value}")
+                continue
+            value, unit, higher_is_better = value
+            results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+            print(f"{name:<36} {value:>14.2f} {unit}")
+
+    output = {"meta": {"time": strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(),
+                       "platform": platform.platform(),
+                       "cpus": os.cpu_count()},
+              "results": results,
+              "skipped": skipped}
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(output, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)["results"]
+        regressions = 0
+        print()
+        for name, old, new, change, regressed in compare(results, baseline, args.tolerance):
+            flag = "REGRESSION" if regressed else ""
+            print(f"{name:<36} {old:>14.2f} -> {new:>14.2f} {change:+7.1%} {flag}")
+            regressions += regressed
+        if regressions:
+            print(f"\n{regressions} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
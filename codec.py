@@ -0,0 +1,315 @@
+import itertools
+from collections import deque
+
+import levels
+import logic
+
+# Every record starts with one byte.
+# A tick record holds the direction moved in its low two bits and these flags
+TAIL_POPPED = 0x04  # The tail moved, i.e. the snake didn't grow
+FOOD_CHANGED = 0x08  # Followed by a varint, the new food's cell + 1 or 0 for none. The snake ate
+STATE_CHANGED = 0x10  # Followed by a byte, the new GameState's index in logic.STATES
+# A keyframe is this byte followed by the whole game, see Encoder.write_keyframe
+KEYFRAME = 0x80
+
+# A stream has a keyframe at least this often, so it can be joined or cut partway through
+KEYFRAME_EVERY = 256
+
+_DIRECTION_INDEX = {direction: index for index, direction in enumerate(logic.DIRECTIONS)}
+_STATE_INDEX = {state: index for index, state in enumerate(logic.STATES)}
+_STEP_INDEX = {logic.MOVES[direction]: index for index, direction in enumerate(logic.DIRECTIONS)}
+
+
+class Encoder:
+    """Turns each tick of a logic.Game into a few bytes.
+
+    Call tick() after each game.tick(). Most ticks come out as a single byte: the direction the head moved and
+    whether the tail followed. Eating adds the new food cell and the game ending adds the new state.
+    A keyframe with the whole game goes out first, every keyframe_every ticks after that, and whenever the game
+    jumps (a reset or restore gives it a new snake). Cells are y * width + x as varints.
+
+    Bytes build up in out until taken with take(). The tick path only appends to out, so apart from the
+    ints it does sums with nothing is built per tick.
+    """
+
+    def __init__(self, game: logic.Game, keyframe_every: int = KEYFRAME_EVERY):
+        self.game = game
+        self.keyframe_every = keyframe_every
+        self.out = bytearray()
+
+        self.snake = None  # Snake at the last record, a different one means the game jumped
+        self.length = 0
+        self.food_pos = None
+        self.state = None
+        self.ticks = 0
+        self.since_keyframe = 0
+
+    def take(self) -> bytes:
+        """Everything encoded since the last call"""
+        data = bytes(self.out)
+        self.out.clear()
+        return data
+
+    def tick(self) -> None:
+        """Encode the tick the game just ran"""
+        game = self.game
+        snake = game.snake
+        self.ticks += 1
+        if snake is not self.snake or self.since_keyframe >= self.keyframe_every:
+            self.write_keyframe(self.out)
+            return None
+        self.since_keyframe += 1
+
+        out = self.out
+        board = game.board
+        header = _DIRECTION_INDEX[snake.direction]
+        length = len(snake.body)
+        if length == self.length:
+            header |= TAIL_POPPED
+        self.length = length
+
+        food_changed = board.food_pos is not self.food_pos
+        if food_changed:
+            header |= FOOD_CHANGED
+            self.food_pos = board.food_pos
+        state_changed = game.GameState != self.state
+        if state_changed:
+            header |= STATE_CHANGED
+            self.state = game.GameState
+
+        out.append(header)
+        if food_changed:
+            food_pos = board.food_pos
+            levels.write_varint(out, food_pos[1] * board.width + food_pos[0] + 1 if food_pos else 0)
+        if state_changed:
+            out.append(_STATE_INDEX[game.GameState])
+
+    def keyframe(self) -> bytes:
+        """A keyframe on its own, e.g. to start a client off partway through a stream"""
+        data = bytearray()
+        self.write_keyframe(data)
+        return bytes(data)
+
+    def write_keyframe(self, out: bytearray) -> None:
+        """Append the whole game: size, wrapping, state, direction, snake level, food, tick count, body length,
+        head cell, the direction of each step along the body and the level's obstacles (levels.Level.to_bytes)"""
+        game = self.game
+        board = game.board
+        snake = game.snake
+        width = board.width
+
+        out.append(KEYFRAME)
+        for value in (width, board.height, game.board_wrapping, _STATE_INDEX[game.GameState],
+                      _DIRECTION_INDEX[snake.direction], snake.level,
+                      board.food_pos[1] * width + board.food_pos[0] + 1 if board.food_pos else 0,
+                      self.ticks, len(snake.body)):
+            levels.write_varint(out, value)
+        # A head that died off the edge of a board that doesn't wrap is stored as a cell past the end
+        head_x, head_y = snake.body[0]
+        levels.write_varint(out, _cell(head_x, head_y, width, board.height))
+
+        # The rest of the body as the step from each segment to the next, four to a byte
+        packed = 0
+        count = 0
+        previous = snake.body[0]
+        for x, y in itertools.islice(snake.body, 1, None):
+            dx = x - previous[0]
+            dy = y - previous[1]
+            # A step across a wrapped edge looks like a jump to the other side
+            dx = -1 if dx > 1 else 1 if dx < -1 else dx
+            dy = -1 if dy > 1 else 1 if dy < -1 else dy
+            packed |= _STEP_INDEX[(dx, dy)] << (count * 2)
+            count += 1
+            if count == 4:
+                out.append(packed)
+                packed = 0
+                count = 0
+            previous = (x, y)
+        if count:
+            out.append(packed)
+        level = board.level.to_bytes() if board.level is not None else b""
+        levels.write_varint(out, len(level))
+        out += level
+
+        self.snake = snake
+        self.length = len(snake.body)
+        self.food_pos = board.food_pos
+        self.state = game.GameState
+        self.since_keyframe = 0
+
+
+class Decoder:
+    """Rebuilds a game's state from an Encoder's bytes, without running the game.
+
+    feed() takes bytes as they arrive, in pieces of any size. Records before the first keyframe are skipped.
+    After each record the state is in width, height, wrapping, state, direction, level (the snake's),
+    food ((x, y) or None), body (deque of (x, y), head first), obstacles (levels.Level or None) and ticks,
+    and the cells it changed are added to changed_cells.
+    """
+
+    def __init__(self):
+        self.pending = b""
+        self.synced = False
+
+        self.width = 0
+        self.height = 0
+        self.wrapping = True
+        self.state = logic.OFF
+        self.direction = logic.E
+        self.level = 1
+        self.food = None
+        self.body = deque()
+        self.obstacles = None
+        self.ticks = 0
+        self.changed_cells = set()
+
+    def feed(self, data: bytes) -> int:
+        """Decode every complete record in the bytes so far. Returns how many there were"""
+        data = self.pending + data if self.pending else data
+        offset = 0
+        count = 0
+        while offset < len(data):
+            try:
+                offset = self._record(data, offset)
+            except IndexError:
+                break  # The rest of the record hasn't arrived yet
+            count += 1
+        self.pending = bytes(data[offset:])
+        return count
+
+    def pop_changed_cells(self) -> set:
+        changed = self.changed_cells
+        self.changed_cells = set()
+        return changed
+
+    def _record(self, data: bytes, offset: int) -> int:
+        header = data[offset]
+        offset += 1
+        if header == KEYFRAME:
+            return self._keyframe(data, offset)
+
+        # Read everything first, so a record cut short changes nothing
+        food = None
+        if header & FOOD_CHANGED:
+            food, offset = levels.read_varint(data, offset)
+        state = data[offset] if header & STATE_CHANGED else None
+        if state is not None:
+            offset += 1
+        if not self.synced:
+            return offset
+
+        changed = self.changed_cells
+        direction = logic.DIRECTIONS[header & 0x03]
+        dx, dy = logic.MOVES[direction]
+        x, y = self.body[0]
+        x += dx
+        y += dy
+        if self.wrapping:
+            x %= self.width
+            y %= self.height
+        self.direction = direction
+        self.body.appendleft((x, y))
+        changed.add((x, y))
+        if header & TAIL_POPPED:
+            changed.add(self.body.pop())
+        if food is not None:
+            if self.food is not None:
+                changed.add(self.food)
+            self.food = divmod(food - 1, self.width)[::-1] if food else None
+            if self.food is not None:
+                changed.add(self.food)
+            self.level += 1
+        if state is not None:
+            self.state = logic.STATES[state]
+        self.ticks += 1
+        return offset
+
+    def _keyframe(self, data: bytes, offset: int) -> int:
+        values = []
+        for _ in range(9):
+            value, offset = levels.read_varint(data, offset)
+            values.append(value)
+        width, height, wrapping, state, direction, level, food, ticks, length = values
+        head, offset = levels.read_varint(data, offset)
+        x, y = _position(head, width, height)
+        body = deque([(x, y)])
+        for i in range(length - 1):
+            dx, dy = logic.MOVES[logic.DIRECTIONS[(data[offset + i // 4] >> (i % 4 * 2)) & 0x03]]
+            x += dx
+            y += dy
+            if wrapping:
+                x %= width
+                y %= height
+            body.append((x, y))
+        offset += (length + 2) // 4
+        level_len, offset = levels.read_varint(data, offset)
+        if offset + level_len > len(data):
+            raise IndexError("keyframe cut short")
+        obstacles = levels.Level.from_bytes(data[offset:offset + level_len]) if level_len else None
+        offset += level_len
+
+        # Everything that was shown before may have changed
+        self.changed_cells.update(self.body)
+        if self.food is not None:
+            self.changed_cells.add(self.food)
+        if (width, height) != (self.width, self.height) or obstacles is not None or self.obstacles is not None:
+            self.changed_cells.update((x, y) for y in range(height) for x in range(width))
+
+        self.width = width
+        self.height = height
+        self.wrapping = bool(wrapping)
+        self.state = logic.STATES[state]
+        self.direction = logic.DIRECTIONS[direction]
+        self.level = level
+        self.food = divmod(food - 1, width)[::-1] if food else None
+        self.body = body
+        self.obstacles = obstacles
+        self.ticks = ticks
+        self.synced = True
+        self.changed_cells.update(body)
+        if self.food is not None:
+            self.changed_cells.add(self.food)
+        return offset
+
+    def cell_char(self, x: int, y: int) -> str:
+        """The character a cell is drawn with, as logic.Game.cell_char"""
+        if self.body and (x, y) == self.body[0]:
+            return "S"
+        if (x, y) in self.body:
+            return "s"
+        if self.food == (x, y):
+            return "*"
+        if self.obstacles is not None and self.obstacles.obstacles[y * self.width + x]:
+            return "X"
+        return "."
+
+
+def _cell(x: int, y: int, width: int, height: int) -> int:
+    if 0 <= x < width and 0 <= y < height:
+        return y * width + x
+    # Off the board: 4 cells per side past the end, for a head one step off an edge
+    return width * height + (0 if x < 0 else 1 if x >= width else 2 if y < 0 else 3) + 4 * (
+        y if x < 0 or x >= width else x)
+
+
+def _position(cell: int, width: int, height: int) -> tuple:
+    if cell < width * height:
+        y, x = divmod(cell, width)
+        return x, y
+    along, side = divmod(cell - width * height, 4)
+    return ((-1, along), (width, along), (along, -1), (along, height))[side]
+
+
+def encode_record(record: dict, keyframe_every: int = KEYFRAME_EVERY) -> bytes:
+    """Play a game record (see logic.Game.get_record) back and encode every tick of it"""
+    import replay
+    game = replay.new_game(record)
+    encoder = Encoder(game, keyframe_every)
+    encoder.write_keyframe(encoder.out)
+    for direction in record["inputs"]:
+        game.snake.update_direction(direction)
+        running = game.tick()
+        encoder.tick()
+        if not running:
+            break
+    return encoder.take()
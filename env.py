@@ -0,0 +1,111 @@
+import numpy as np
+
+import logic
+
+# Actions are indexes into this, the same order batch.BatchGame uses
+ACTIONS = logic.DIRECTIONS
+
+# Observation planes
+HEAD = 0
+BODY = 1
+FOOD = 2
+OBSTACLE = 3
+PLANES = 4
+
+# Rewards handed back from step(), batch.BatchGame uses the same
+REWARD_FOOD = 1.0
+REWARD_DEATH = -1.0
+
+
+class SnakeEnv:
+    """reset/step environment over a single logic.Game.
+
+    Observations are a (PLANES, height, width) float32 array of 0/1 board planes.
+    The same array is returned every step and only the cells the game reports as changed are rewritten,
+    so take a copy if older observations need keeping.
+    """
+
+    def __init__(self, width: int = 30, height: int = 30, wrapping: bool = True, seed: int = None):
+        self.game = logic.Game(width=width, height=height, wrapping=wrapping, seed=seed, record=False,
+                               track_changes=True)
+        self.observation = np.zeros((PLANES, height, width), dtype=np.float32)
+        # Writing single cells through a flat memoryview is much cheaper than indexing the array
+        self._cells = memoryview(self.observation.reshape(-1))
+        self._plane_size = width * height
+        self.info = {}
+        self.reset(seed)
+
+    def reset(self, seed: int = None) -> np.ndarray:
+        """Start a new game and return the first observation"""
+        self.game.reset(seed)
+        self.game.start_game()
+        self.game.pop_changed_cells()
+
+        obs = self.observation
+        obs.fill(0.0)
+        body = self.game.snake.body
+        for x, y in body:
+            obs[BODY, y, x] = 1.0
+        head_x, head_y = body[0]
+        obs[BODY, head_y, head_x] = 0.0
+        obs[HEAD, head_y, head_x] = 1.0
+        if self.game.board.food_pos:
+            food_x, food_y = self.game.board.food_pos
+            obs[FOOD, food_y, food_x] = 1.0
+        grid = np.frombuffer(self.game.board.grid, dtype=np.uint8).reshape(obs.shape[1:])
+        obs[OBSTACLE] = grid == logic.OBSTA
+
+        self._update_info()
+        return obs
+
+    def step(self, action):
+        """Move the snake one tick. action is an index into ACTIONS, or None to keep going the same way.
+        Returns (observation, reward, done, info)"""
+        game = self.game
+        if not game.GameOn:
+            return self.observation, 0.0, True, self.info
+
+        if action is not None:
+            game.snake.update_direction(ACTIONS[action])
+
+        level = game.snake.level
+        alive = game.tick()
+
+        if not alive and game.GameState == logic.OVER:
+            reward = REWARD_DEATH
+        elif game.snake.level != level:
+            reward = REWARD_FOOD
+        else:
+            reward = 0.0
+
+        self._update_cells(game.pop_changed_cells())
+        self._update_info()
+        return self.observation, reward, not alive, self.info
+
+    def _update_cells(self, cells) -> None:
+        """Rewrite the planes for the given cells"""
+        obs = self._cells
+        size = self._plane_size
+        board = self.game.board
+        width = board.width
+        head = self.game.snake.body[0]
+        for x, y in cells:
+            if not (0 <= x < width and 0 <= y < board.height):
+                continue
+            i = y * width + x
+            obs[HEAD * size + i] = 0.0
+            obs[BODY * size + i] = 0.0
+            obs[FOOD * size + i] = 0.0
+            if board.occupancy[i]:
+                if (x, y) == head:
+                    obs[HEAD * size + i] = 1.0
+                else:
+                    obs[BODY * size + i] = 1.0
+            elif board.grid[i] == logic.FOOD:
+                obs[FOOD * size + i] = 1.0
+
+    def _update_info(self) -> None:
+        info = self.info
+        info["level"] = self.game.snake.level
+        info["length"] = self.game.snake.length
+        info["state"] = self.game.GameState
@@ -0,0 +1,225 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+from multiprocessing import Pool
+from time import perf_counter
+
+import autopilot
+import logic
+import results
+
+# Outcome of a game that was still going when it hit the tick limit
+TIMEOUT = "timeout"
+
+
+class RandomPolicy:
+    """Picks a random direction each tick, avoiding moves that would kill it when it can"""
+
+    def __init__(self):
+        self.rng = random.Random()
+
+    def reset(self, seed: int) -> None:
+        self.rng.seed(seed)
+
+    def __call__(self, game: logic.Game):
+        safe = [d for d in logic.DIRECTIONS if game.is_safe_move(d)]
+        if not safe:
+            return None
+        return self.rng.choice(safe)
+
+
+class GreedyPolicy:
+    """Takes the safe move that gets closest to the food"""
+
+    def __call__(self, game: logic.Game):
+        if not game.board.food_pos:
+            return None
+
+        food_x, food_y = game.board.food_pos
+        width, height = game.board.width, game.board.height
+
+        best = None
+        best_distance = None
+        for direction in logic.DIRECTIONS:
+            if not game.is_safe_move(direction):
+                continue
+            x, y = game.move_target(direction)
+            dx = abs(food_x - x)
+            dy = abs(food_y - y)
+            if game.board_wrapping:
+                dx = min(dx, width - dx)
+                dy = min(dy, height - dy)
+            if best_distance is None or dx + dy < best_distance:
+                best = direction
+                best_distance = dx + dy
+        return best
+
+
+POLICIES = {"random": RandomPolicy,
+            "greedy": GreedyPolicy,
+            "autopilot": autopilot.Autopilot}
+
+
+def load_policy(name: str):
+    """Build a policy from its name, or from 'module:attribute' naming a zero argument factory or class.
+    A policy is called with the game each tick and returns a direction (or None to carry on).
+    If it has a reset(seed) method that is called at the start of every game."""
+    if name in POLICIES:
+        return POLICIES[name]()
+
+    if ":" not in name:
+        raise ValueError(f"Unknown policy '{name}'. Use one of {', '.join(POLICIES)} or module:attribute")
+    module_name, attribute = name.split(":", 1)
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def play(game: logic.Game, policy, seed: int, max_ticks: int) -> tuple:
+    """Play one game to the end on an existing Game. Returns (seed, level, length, ticks, outcome, cause of death)"""
+    game.reset(seed)
+    game.start_game()
+    reset = getattr(policy, "reset", None)
+    if reset is not None:
+        reset(seed)
+
+    snake_ticks = 0
+    while game.GameOn and snake_ticks < max_ticks:
+        direction = policy(game)
+        if direction is not None:
+            game.snake.update_direction(direction)
+        game.tick()
+        snake_ticks += 1
+
+    outcome = game.GameState if not game.GameOn else TIMEOUT
+    return seed, game.snake.level, game.snake.length, snake_ticks, outcome, game.death_cause
+
+
+# Each worker builds its game and policy once and reuses them for every seed it is sent
+_worker = {}
+
+
+def _init_worker(config: dict) -> None:
+    _worker["game"] = logic.Game(width=config["width"], height=config["height"], wrapping=config["wrapping"],
+                                 ms_per_update=config["tick_speed"], seed=0, record=False)
+    _worker["policy"] = load_policy(config["policy"])
+    _worker["max_ticks"] = config["max_ticks"]
+
+
+def _run_batch(seeds) -> tuple:
+    """Play a batch of seeds in a worker. Only the seeds go in and small result tuples come back"""
+    start = perf_counter()
+    batch = [play(_worker["game"], _worker["policy"], seed, _worker["max_ticks"]) for seed in seeds]
+    return os.getpid(), perf_counter() - start, batch
+
+
+def percentile(sorted_values: list, pct: float):
+    """Nearest rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0
+    return sorted_values[results.percentile_rank(pct, len(sorted_values)) - 1]
+
+
+def summarise(name: str, values: list) -> str:
+    values = sorted(values)
+    mean = sum(values) / len(values) if values else 0
+    return (f"{name}: mean {mean:.1f}  p50 {percentile(values, 50)}  p90 {percentile(values, 90)}  "
+            f"p99 {percentile(values, 99)}  max {values[-1] if values else 0}")
+
+
+def run_farm(config: dict, seeds: range, workers: int, batch_size: int, on_batch=None) -> dict:
+    """Play every seed across a pool of worker processes.
+    on_batch is called in this process with each list of result tuples as it arrives"""
+    batches = [seeds[i:i + batch_size] for i in range(0, len(seeds), batch_size)]
+
+    lengths = []
+    ticks = []
+    outcomes = {}
+    worker_stats = {}  # pid -> [games, busy seconds]
+
+    start = perf_counter()
+    with Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+        for pid, busy, batch in pool.imap_unordered(_run_batch, batches):
+            for seed, level, length, snake_ticks, outcome, cause in batch:
+                lengths.append(length)
+                ticks.append(snake_ticks)
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            stats = worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += len(batch)
+            stats[1] += busy
+            if on_batch is not None:
+                on_batch(batch)
+
+    return {"games": len(lengths),
+            "duration": perf_counter() - start,
+            "lengths": lengths,
+            "ticks": ticks,
+            "outcomes": outcomes,
+            "workers": worker_stats}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Play many headless games across processes and report statistics")
+    parser.add_argument("--games", type=int, default=1000, help="Number of games to play")
+    parser.add_argument("--seed-start", type=int, default=0, help="Seed of the first game, the rest count up")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=30)
+    parser.add_argument("--no-wrap", action="store_true", help="Hitting the edge of the board ends the game")
+    parser.add_argument("--tick-speed", type=int, default=100, help="ms per tick, recorded with the settings only")
+    parser.add_argument("--max-ticks", type=int, default=10000, help="Stop a game that lasts this many ticks")
+    parser.add_argument("--policy", default="random",
+                        help=f"One of {', '.join(POLICIES)} or module:attribute for a plug-in")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--batch-size", type=int, default=50, help="Games sent to a worker at a time")
+    parser.add_argument("--out", help="Write every game's result to this JSON lines file")
+    parser.add_argument("--db", nargs="?", const=results.RESULTS_FILE,
+                        help=f"Add every game's result to this results store (default {results.RESULTS_FILE})")
+    args = parser.parse_args(argv)
+
+    config = {"width": args.width,
+              "height": args.height,
+              "wrapping": not args.no_wrap,
+              "tick_speed": args.tick_speed,
+              "max_ticks": args.max_ticks,
+              "policy": args.policy}
+    # Fail here rather than in every worker
+    load_policy(args.policy)
+
+    out_file = open(args.out, "w") if args.out else None
+    store = results.ResultsStore(args.db) if args.db else None
+    player = f"bot:{args.policy}"
+
+    def write_batch(batch):
+        if out_file is not None:
+            for seed, level, length, snake_ticks, outcome, cause in batch:
+                out_file.write(json.dumps({"seed": seed, "level": level, "length": length, "ticks": snake_ticks,
+                                           "outcome": outcome,
+                                           "cause": cause if outcome == logic.OVER else None}) + "\n")
+        if store is not None:
+            for seed, level, length, snake_ticks, outcome, cause in batch:
+                store.add(results.make_row(player, args.width, args.height, not args.no_wrap, args.tick_speed,
+                                           seed, level, length, snake_ticks, outcome, cause))
+
+    try:
+        seeds = range(args.seed_start, args.seed_start + args.games)
+        summary = run_farm(config, seeds, args.workers, args.batch_size, on_batch=write_batch)
+    finally:
+        if out_file is not None:
+            out_file.close()
+        if store is not None:
+            store.close()
+
+    duration = summary["duration"]
+    print(f"Games: {summary['games']} in {duration:.2f}s ({summary['games'] / duration:.1f} games/s) "
+          f"across {args.workers} workers")
+    print(summarise("Length", summary["lengths"]))
+    print(summarise("Ticks", summary["ticks"]))
+    print("Outcomes: " + ", ".join(f"{k} {v}" for k, v in sorted(summary["outcomes"].items())))
+    for pid, (games, busy) in sorted(summary["workers"].items()):
+        print(f"Worker {pid}: {games} games, {games / busy if busy else 0:.1f} games/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
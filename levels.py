@@ -0,0 +1,335 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate, compress, repeat
+from operator import add, mul
+
+import logic
+import settings
+
+LEVELS_DIR = os.path.join(settings.FILES_DIR, "Levels")
+DEFAULT_PACK = os.path.join(LEVELS_DIR, "classic.snakelevels")
+
+# Pack file layout: header, then an index entry and name for every level, then the levels' cell data.
+# Offsets in the index are from the start of the file
+PACK_MAGIC = b"SNKL"
+PACK_VERSION = 1
+_PACK_HEADER = struct.Struct("<4sBH")
+# offset, size, width, height, spawn x, spawn y, spawn direction, encoding, name length
+_ENTRY = struct.Struct("<IIHHHHBBB")
+
+# How a level's obstacle map is stored, whichever comes out smaller
+RLE = 0  # Alternating runs of open and blocked cells as varints, starting with open
+BITS = 1  # One bit per cell, first cell in the top bit
+
+# Text levels: one character per cell
+TEXT_OPEN = "."
+TEXT_OBSTACLE = "X"
+TEXT_SPAWN = "S"
+
+_BITS_TO_CELLS = bytes.maketrans(b"01", b"\x00\x01")
+_CELLS_TO_BITS = bytes.maketrans(b"\x00\x01", b"01")
+_CELLS_TO_TEXT = bytes.maketrans(b"\x00\x01", (TEXT_OPEN + TEXT_OBSTACLE).encode())
+_OPEN_MASK = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+
+class Level:
+    """A board layout: its size, which cells are obstacles and where the snake starts.
+
+    obstacles is one byte per cell, y * width + x, 1 for an obstacle and 0 for open. That is the same as the
+    values logic.Board keeps in its grid, so a board takes on a level with a single copy.
+    """
+
+    def __init__(self, width: int, height: int, obstacles: bytes = None, spawn: tuple = None,
+                 direction: str = "e", name: str = ""):
+        if obstacles is None:
+            obstacles = bytes(width * height)
+        if len(obstacles) != width * height:
+            raise ValueError(f"A {width}x{height} level needs {width * height} cells, not {len(obstacles)}")
+        if spawn is None:
+            spawn = (width // 2, height // 2)
+        if not (0 <= spawn[0] < width and 0 <= spawn[1] < height) or obstacles[spawn[1] * width + spawn[0]]:
+            raise ValueError(f"Level {name!r} has its spawn point {spawn} off the board or on an obstacle")
+        if direction not in logic.DIRECTIONS:
+            raise ValueError(f"Unknown spawn direction {direction!r}")
+
+        self.width = width
+        self.height = height
+        self.obstacles = bytes(obstacles)
+        self.spawn = tuple(spawn)
+        self.direction = direction
+        self.name = name
+
+        self._open = None  # (cells, slots), see open_cells
+
+    def __repr__(self):
+        return f"Level({self.name!r}, {self.width}x{self.height}, {self.obstacle_count()} obstacles)"
+
+    def obstacle_count(self) -> int:
+        return self.obstacles.count(1)
+
+    def open_cells(self):
+        """The free cell list and slots (see logic.Board) for an empty board with this level on it.
+        Worked out once per level at C speed and copied from then on.
+        Levels are shared between games on different threads, so both arrays are stored in one assignment"""
+        if self._open is None:
+            is_open = self.obstacles.translate(_OPEN_MASK)
+            cells = array("i", compress(range(len(is_open)), is_open))
+            # Each open cell's slot is how many open cells come before it, obstacles get -1
+            slots = array("i", map(add, map(mul, accumulate(is_open), is_open), repeat(-1)))
+            self._open = (cells, slots)
+        return self._open
+
+    # Text
+
+    @classmethod
+    def from_text(cls, text: str, name: str = "", direction: str = "e"):
+        """Read a level drawn as text, X for an obstacle, S for the spawn point and anything else open"""
+        rows = [line.rstrip("\r\n") for line in text.splitlines() if line.strip()]
+        if not rows:
+            raise ValueError(f"Level {name!r} is empty")
+        width = max(len(row) for row in rows)
+        height = len(rows)
+
+        cells = bytearray(width * height)
+        spawn = None
+        for y, row in enumerate(rows):
+            for x, char in enumerate(row):
+                if char == TEXT_OBSTACLE:
+                    cells[y * width + x] = 1
+                elif char == TEXT_SPAWN:
+                    spawn = (x, y)
+        return cls(width, height, bytes(cells), spawn, direction, name)
+
+    def to_text(self) -> str:
+        rows = []
+        for y in range(self.height):
+            rows.append(self.obstacles[y * self.width:(y + 1) * self.width].translate(_CELLS_TO_TEXT).decode())
+        x, y = self.spawn
+        rows[y] = rows[y][:x] + TEXT_SPAWN + rows[y][x + 1:]
+        return "\n".join(rows) + "\n"
+
+    # Binary
+
+    def encode(self) -> tuple:
+        """(encoding, data) for the obstacle map, whichever of RLE and BITS is smaller"""
+        runs = bytearray()
+        value = 0
+        start = 0
+        cells = self.obstacles
+        while start < len(cells):
+            end = cells.find(b"\x01" if value == 0 else b"\x00", start)
+            if end == -1:
+                end = len(cells)
+            write_varint(runs, end - start)
+            start = end
+            value ^= 1
+
+        bits = (len(cells) + 7) // 8
+        if len(runs) <= bits:
+            return RLE, bytes(runs)
+        packed = int(cells.translate(_CELLS_TO_BITS) + b"0" * (bits * 8 - len(cells)), 2)
+        return BITS, packed.to_bytes(bits, "big")
+
+    @classmethod
+    def decode(cls, width: int, height: int, encoding: int, data, spawn: tuple, direction: str, name: str = ""):
+        cells = width * height
+        if encoding == RLE:
+            parts = []
+            value = 0
+            offset = 0
+            pieces = (b"\x00", b"\x01")
+            while offset < len(data):
+                run, offset = read_varint(data, offset)
+                parts.append(pieces[value] * run)
+                value ^= 1
+            obstacles = b"".join(parts)
+        elif encoding == BITS:
+            text = bin(int.from_bytes(data, "big"))[2:].zfill(len(data) * 8)
+            obstacles = text[:cells].encode().translate(_BITS_TO_CELLS)
+        else:
+            raise ValueError(f"Level {name!r} has an unknown encoding {encoding}")
+        if len(obstacles) != cells:
+            raise ValueError(f"Level {name!r} is corrupt, its map has {len(obstacles)} of {cells} cells")
+        return cls(width, height, obstacles, spawn, direction, name)
+
+    def to_bytes(self) -> bytes:
+        """The level on its own, in the same form as an entry in a pack, e.g. for a game record"""
+        encoding, data = self.encode()
+        name = self.name.encode()
+        return _ENTRY.pack(0, len(data), self.width, self.height, *self.spawn,
+                           logic.DIRECTIONS.index(self.direction), encoding, len(name)) + name + data
+
+    @classmethod
+    def from_bytes(cls, blob: bytes):
+        (_, size, width, height, spawn_x, spawn_y, direction, encoding, name_len) = _ENTRY.unpack_from(blob)
+        start = _ENTRY.size + name_len
+        if len(blob) != start + size:
+            raise ValueError("Level data is truncated or corrupt")
+        name = bytes(blob[_ENTRY.size:start]).decode()
+        return cls.decode(width, height, encoding, memoryview(blob)[start:], (spawn_x, spawn_y),
+                          logic.DIRECTIONS[direction], name)
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    """Append a non negative int, 7 bits a byte with the top bit set on all but the last"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset: int) -> tuple:
+    """(value, offset after it) for a varint starting at offset. IndexError if it runs off the end"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class LevelPack:
+    """A file of many levels, memory mapped.
+
+    Opening a pack only reads its index. A level's cells are read straight out of the mapping when it is asked
+    for, so switching levels costs a decode of one small obstacle map however many levels the pack holds.
+    Levels are looked up by index or by name.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, count = _PACK_HEADER.unpack_from(self.map)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"{path} is not a level pack, or is from another version")
+
+            self.entries = []
+            self.names = {}
+            offset = _PACK_HEADER.size
+            for index in range(count):
+                entry = _ENTRY.unpack_from(self.map, offset)
+                offset += _ENTRY.size
+                name = self.map[offset:offset + entry[-1]].decode()
+                offset += entry[-1]
+                if entry[0] + entry[1] > len(self.map):
+                    raise ValueError(f"{path} is truncated, level {name!r} runs past the end")
+                self.entries.append(entry[:-1] + (name,))
+                self.names[name] = index
+        except (ValueError, struct.error):
+            self.map.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, key) -> Level:
+        index = self.names[key] if isinstance(key, str) else key
+        offset, size, width, height, spawn_x, spawn_y, direction, encoding, name = self.entries[index]
+        data = memoryview(self.map)[offset:offset + size]
+        try:
+            return Level.decode(width, height, encoding, data, (spawn_x, spawn_y), logic.DIRECTIONS[direction], name)
+        finally:
+            data.release()
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def level_names(self) -> list:
+        return [entry[-1] for entry in self.entries]
+
+    def close(self) -> None:
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_pack(path: str, levels: list) -> None:
+    """Write levels to a pack file, replacing it"""
+    names = set()
+    index = bytearray()
+    data = []
+    encoded = []
+    for level in levels:
+        if level.name in names:
+            raise ValueError(f"Two levels are called {level.name!r}")
+        names.add(level.name)
+        encoded.append(level.encode())
+
+    offset = _PACK_HEADER.size + sum(_ENTRY.size + len(level.name.encode()) for level in levels)
+    for level, (encoding, cells) in zip(levels, encoded):
+        name = level.name.encode()
+        index += _ENTRY.pack(offset, len(cells), level.width, level.height, *level.spawn,
+                             logic.DIRECTIONS.index(level.direction), encoding, len(name)) + name
+        data.append(cells)
+        offset += len(cells)
+
+    with open(path, "wb") as file:
+        file.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(levels)))
+        file.write(index)
+        file.writelines(data)
+
+
+def load_level(spec: str) -> Level:
+    """A level from "pack_file:name" or "pack_file:index", a text level file, or the name of a level in DEFAULT_PACK.
+    Raises KeyError for a level that isn't in its pack"""
+    path, _, key = spec.rpartition(":")
+    if not path:
+        if os.path.exists(spec):
+            with open(spec, "r") as file:
+                return Level.from_text(file.read(), name=os.path.splitext(os.path.basename(spec))[0])
+        path = DEFAULT_PACK
+    with LevelPack(path) as pack:
+        if key.isdigit():
+            return pack[int(key)]
+        if key not in pack.names:
+            raise KeyError(f"No level called {key!r} in {path}")
+        return pack[key]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build and inspect level packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Pack text levels into a level pack")
+    build.add_argument("output")
+    build.add_argument("levels", nargs="+", help="Text level files, named after the file")
+
+    show = commands.add_parser("list", help="List the levels in a pack")
+    show.add_argument("pack")
+    show.add_argument("--draw", action="store_true", help="Draw each level as text")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        levels = []
+        for path in args.levels:
+            with open(path, "r") as file:
+                levels.append(Level.from_text(file.read(), name=os.path.splitext(os.path.basename(path))[0]))
+        write_pack(args.output, levels)
+        print(f"Wrote {len(levels)} level(s) to {args.output} ({os.path.getsize(args.output)} bytes)")
+    else:
+        with LevelPack(args.pack) as pack:
+            for index, level in enumerate(pack):
+                print(f"{index}: {level.name} {level.width}x{level.height}, {level.obstacle_count()} obstacles, "
+                      f"spawn {level.spawn} heading {level.direction}")
+                if args.draw:
+                    print(level.to_text())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,16 @@
+import hashlib
 import json
-import os
-from random import randrange
-from time import time
+import random
+import re
+import struct
+import sys
+from array import array
+from collections import deque
+from time import monotonic, perf_counter_ns, sleep, time
+
+# levels imports this module too, so nothing here may use levels until it is called
+import levels
+import settings
 
 # Direction constants
 N = NORTH = "n"
@@ -9,10 +18,29 @@ S = SOUTH = "s"
 E = EAST = "e"
 W = WEST = "w"
 
+# Every direction in a fixed order. Directions are stored as their index here in snapshots, level packs,
+# codec streams and the batch and env action spaces, so the order must never change
+DIRECTIONS = (N, S, E, W)
+
+# How each direction moves the head, and the direction that would turn back on it
+MOVES = {N: (0, -1), S: (0, 1), E: (1, 0), W: (-1, 0)}
+OPPOSITE = {N: S, S: N, E: W, W: E}
+
 # Game state constants
 OFF = "off"
 ON = "on"
 OVER = "over"
+WON = "won"
+# Stored as their index here, like DIRECTIONS
+STATES = (OFF, ON, OVER, WON)
+
+# What ended a game that is OVER, see Game.death_cause
+HIT_SELF = "self"
+HIT_WALL = "wall"  # Left a board that doesn't wrap
+HIT_OBSTACLE = "obstacle"
+
+# Turns a snake holds on to, one is taken each tick. See SnakeNode.update_direction
+INPUT_DEPTH = settings.GAME_DEFAULTS["input_depth"]
 
 # DEBUGGING
 RAISE_ERRORS = True
@@ -32,17 +60,32 @@ A = AVAIL = 0
 O = OBSTA = 1
 F = FOOD = 2
 
-# Store a reference of all snake nodes for easy reference
-AllSnakeNodes = []
+# Board.copy brings a previous copy back in line by redoing just the cells changed since, rather than copying
+# every array, when fewer than one cell in this many has changed
+REDO_CELLS = 256
 
 
 class Board:
     """The main board controller for the game"""
 
-    def __init__(self, width: int = 30, height: int = 30):
+    def __init__(self, width: int = 30, height: int = 30, rng: random.Random = None):
         self.width = width
         self.height = height
 
+        # Food placement is the only randomness in the game
+        self.rng = rng if rng is not None else random.Random()
+
+        # levels.Level whose obstacles are on the grid, see set_level
+        self.level = None
+
+        # Once the board has been copied, every cell changed through occupy, release and the food methods is
+        # logged so copies can catch up cheaply, see copy. None when not logging. epoch goes up each time the log
+        # starts again, so a copy can tell its place in the log is gone.
+        # source is (board, its epoch, its log length, own epoch, own log length) as of the last copy from it
+        self.changes = None
+        self.epoch = 0
+        self.source = None
+
         # Set up the grid
         self.setup_grid()
 
@@ -52,13 +95,194 @@ class Board:
 
     def setup_grid(self):
         """Sets up the grid data"""
-        self.grid = []
+        cells = self.width * self.height
+
+        # One byte per cell (y * width + x) holding AVAIL, OBSTA or FOOD. Read it through view()
+        self.grid = bytearray(cells)
+
+        # One byte per cell, the id of the snake on it or 0.
+        # A single snake game always uses id 1, see arena.Arena for boards shared by several
+        self.occupancy = bytearray(cells)
+
+        # Every cell without a snake on it, in no particular order, and where each cell sits in that list.
+        # Cells are swap-removed so picking, adding and removing a free cell are all O(1).
+        self.free_cells = array("i", range(cells))
+        self.free_slots = array("i", self.free_cells)  # -1 for occupied cells and obstacles
+        self.changes = None
+
+        # A level is dropped if the board has been resized under it
+        if self.level is not None and (self.level.width, self.level.height) != (self.width, self.height):
+            self.level = None
+        if self.level is not None:
+            self.grid[:] = self.level.obstacles
+            self.free_cells[:], self.free_slots[:] = self.level.open_cells()
+
+    def set_level(self, level) -> None:
+        """Put a levels.Level's obstacles on the board, or take them off again with None, and clear it.
+        Obstacles stay through clear() and are never in the free cell list, so food can't land on them"""
+        if level is not None and (level.width, level.height) != (self.width, self.height):
+            raise ValueError(f"A {level.width}x{level.height} level doesn't fit a {self.width}x{self.height} board")
+        self.level = level
+        self.setup_grid()
+        self.food_pos = []
+
+    def view(self) -> memoryview:
+        """Read only (height, width) view of the grid, indexed view[y, x], without copying it"""
+        return memoryview(self.grid).toreadonly().cast("B", (self.height, self.width))
+
+    def clear(self) -> None:
+        """Empty the board for a new game, reusing its storage unless the board changed size"""
+        cells = self.width * self.height
+        if len(self.occupancy) != cells or len(self.grid) != cells:
+            self.setup_grid()
+            return None
+
+        # Food is the only thing a game puts on the grid, the level's obstacles stay
+        if self.food_pos:
+            self.grid[self.food_pos[1] * self.width + self.food_pos[0]] = AVAIL
+            self.food_pos = []
+
+        # Back to the same order as a fresh board, so food placement is the same for a given seed
+        self.changes = None
+        self.occupancy[:] = bytes(cells)
+        if self.level is not None:
+            self.free_cells[:], self.free_slots[:] = self.level.open_cells()
+        else:
+            self.free_cells[:] = array("i", range(cells))
+            self.free_slots[:] = self.free_cells
+
+    def copy(self, rng: random.Random = None, into=None):
+        """A separate copy of the board.
+        into reuses another board's storage when it is the same size. If into was last copied from this board,
+        only the cells either board has changed since are copied over, otherwise every array is copied at C speed"""
+        if self.changes is None:
+            self.changes = array("i")
+            self.epoch += 1
+
+        if into is None or len(into.grid) != len(self.grid):
+            board = Board.__new__(Board)
+            board.grid = bytearray(self.grid)
+            board.occupancy = bytearray(self.occupancy)
+            board.free_cells = array("i", self.free_cells)
+            board.free_slots = array("i", self.free_slots)
+            board.changes = None
+            board.epoch = 0
+        else:
+            board = into
+            if not board.catch_up(self):
+                board.grid[:] = self.grid
+                board.occupancy[:] = self.occupancy
+                board.free_cells[:] = self.free_cells
+                board.free_slots[:] = self.free_slots
+                board.changes = None
+
+        if board.changes is None:
+            # Every cell may have changed, copies of this copy have to start again
+            board.changes = array("i")
+            board.epoch += 1
+        board.source = (self, self.epoch, len(self.changes), board.epoch, len(board.changes))
+        board.width = self.width
+        board.height = self.height
+        board.level = self.level
+        board.food_pos = list(self.food_pos)
+        board.rng = rng if rng is not None else self.rng
+        return board
+
+    def catch_up(self, source) -> bool:
+        """Make this board match source again by copying over the cells either has changed since this board
+        was last copied from it. Returns False, changing nothing, if that isn't possible or would cost more
+        than copying everything"""
+        if self.source is None or self.changes is None or source.changes is None:
+            return False
+        board, epoch, position, own_epoch, own_position = self.source
+        if board is not source or epoch != source.epoch or own_epoch != self.epoch:
+            return False
+        theirs = source.changes
+        ours = self.changes
+        if (len(theirs) - position + len(ours) - own_position) * REDO_CELLS > len(self.grid):
+            return False
+
+        cells = set(theirs[position:])
+        cells.update(ours[own_position:])
+        grid, occupancy, free_cells, free_slots = self.grid, self.occupancy, self.free_cells, self.free_slots
+
+        # A cell that isn't in the set has the same slot in both free cell lists, so once the list is the right
+        # length, putting each changed cell back in its slot leaves it the same as source's
+        count = len(source.free_cells)
+        if len(free_cells) > count:
+            del free_cells[count:]
+        else:
+            free_cells.extend(source.free_cells[len(free_cells):])
+        for cell in cells:
+            grid[cell] = source.grid[cell]
+            occupancy[cell] = source.occupancy[cell]
+            slot = free_slots[cell] = source.free_slots[cell]
+            if slot >= 0:
+                free_cells[slot] = cell
+
+        # Catching up changed these cells here too, as far as this board's own copies are concerned
+        self.log_change(*cells)
+        return True
+
+    def filled_cells(self):
+        """Yield the (x, y) of every cell with a snake, food or an obstacle on it"""
+        width = self.width
+        for data in (self.occupancy, self.grid):
+            for match in _NONZERO.finditer(data):
+                y, x = divmod(match.start(), width)
+                yield x, y
+
+    def is_occupied(self, x: int, y: int) -> bool:
+        """Check if a snake is on the given cell. Cells off the board are never occupied"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.occupancy[y * self.width + x] != 0
+        return False
+
+    def owner(self, x: int, y: int) -> int:
+        """The id of the snake on the given cell, 0 for none or off the board"""
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.occupancy[y * self.width + x]
+        return 0
+
+    def occupy(self, x: int, y: int, owner: int = 1) -> None:
+        """Mark a cell as having a snake on it"""
+        cell = y * self.width + x
+        if self.occupancy[cell]:
+            return None
+        self.occupancy[cell] = owner
+
+        # Swap the last free cell into this one's slot
+        slot = self.free_slots[cell]
+        last = self.free_cells.pop()
+        if last != cell:
+            self.free_cells[slot] = last
+            self.free_slots[last] = slot
+        self.free_slots[cell] = -1
+        if self.changes is not None:
+            self.log_change(cell, last)
+
+    def release(self, x: int, y: int) -> None:
+        """Mark a cell as no longer having a snake on it"""
+        cell = y * self.width + x
+        if not self.occupancy[cell]:
+            return None
+        self.occupancy[cell] = 0
+
+        self.free_slots[cell] = len(self.free_cells)
+        self.free_cells.append(cell)
+        if self.changes is not None:
+            self.log_change(cell)
 
-        for y in range(self.height):
-            row = []
-            for x in range(self.width):
-                row.append(AVAIL)
-            self.grid.append(row)
+    def log_change(self, *cells) -> None:
+        """Add cells to the change log. A log longer than the board is dropped, copying everything is cheaper"""
+        changes = self.changes
+        changes.extend(cells)
+        if len(changes) > len(self.grid):
+            self.changes = None
+
+    def is_full(self) -> bool:
+        """Check if there is nowhere left to put food"""
+        return len(self.free_cells) == 0
 
     def pos_lookup(self, x: int, y: int) -> int:
         """Looks up whats at the coords given and returns that
@@ -70,78 +294,347 @@ class Board:
         elif x >= self.width or x < 0:
             return None
         else:
-            return self.grid[y][x]
+            return self.grid[y * self.width + x]
+
+    def place_food(self) -> bool:
+        """Place a bit of food in a random free location.
+        Returns False if the board is full and there is nowhere to put it"""
+        if self.is_full():
+            self.food_pos = []
+            return False
+
+        cell = self.free_cells[self.rng.randrange(len(self.free_cells))]
+        y, x = divmod(cell, self.width)
+
+        self.grid[cell] = FOOD
+        if self.changes is not None:
+            self.log_change(cell)
+
+        self.food_pos = [x, y]
+        return True
 
-    def place_food(self) -> None:
-        """Place a bit of food in a random location"""
-        y = randrange(0, self.height)
-        x = randrange(0, self.width)
+    def food_ate(self) -> bool:
+        """Remove the food that is currently on the board and then create a new one.
+        Returns False if there was nowhere to put the new food"""
+        cell = self.food_pos[1] * self.width + self.food_pos[0]
+        self.grid[cell] = AVAIL
+        if self.changes is not None:
+            self.log_change(cell)
+        return self.place_food()
 
-        if self.grid[y][x] != AVAIL:
-            self.place_food()
+
+# Sparse boards store cells in square chunks of this many cells a side
+CHUNK_SIZE = 64
+_CHUNK_SHIFT = 6
+_CHUNK_MASK = CHUNK_SIZE - 1
+
+# Boards with more cells than this use SparseBoard unless told otherwise
+SPARSE_CELLS = 1 << 22
+
+
+class ChunkedBytes:
+    """One byte per cell indexed y * width + x, like a bytearray, but only chunks with a non zero byte in
+    them are stored. Reading and writing a cell is a dict lookup and an index, whatever the board size"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.columns = (width + _CHUNK_MASK) >> _CHUNK_SHIFT
+        self.chunks = {}  # Chunk number -> bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        self.filled = {}  # Chunk number -> how many of its bytes are non zero
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    def _locate(self, cell: int) -> tuple:
+        y, x = divmod(cell, self.width)
+        return ((y >> _CHUNK_SHIFT) * self.columns + (x >> _CHUNK_SHIFT),
+                ((y & _CHUNK_MASK) << _CHUNK_SHIFT) | (x & _CHUNK_MASK))
+
+    def __getitem__(self, cell: int) -> int:
+        key, offset = self._locate(cell)
+        chunk = self.chunks.get(key)
+        return chunk[offset] if chunk is not None else 0
+
+    def __setitem__(self, cell: int, value: int) -> None:
+        key, offset = self._locate(cell)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not value:
+                return None
+            chunk = self.chunks[key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+            self.filled[key] = 0
+
+        old = chunk[offset]
+        chunk[offset] = value
+        if old and not value:
+            self.filled[key] -= 1
+            if not self.filled[key]:
+                # Drop empty chunks so memory follows what is on the board
+                del self.chunks[key]
+                del self.filled[key]
+        elif value and not old:
+            self.filled[key] += 1
+
+    def clear(self) -> None:
+        self.chunks.clear()
+        self.filled.clear()
+
+    def copy(self):
+        copy = ChunkedBytes.__new__(ChunkedBytes)
+        copy.width = self.width
+        copy.height = self.height
+        copy.columns = self.columns
+        copy.chunks = {key: bytearray(chunk) for key, chunk in self.chunks.items()}
+        copy.filled = dict(self.filled)
+        return copy
+
+    def nonzero(self):
+        """Yield the index of every non zero cell"""
+        width = self.width
+        for key, chunk in self.chunks.items():
+            chunk_y, chunk_x = divmod(key, self.columns)
+            for match in _NONZERO.finditer(chunk):
+                offset = match.start()
+                x = (chunk_x << _CHUNK_SHIFT) | (offset & _CHUNK_MASK)
+                y = (chunk_y << _CHUNK_SHIFT) | (offset >> _CHUNK_SHIFT)
+                # Chunks on the right and bottom edges hang off the board, but nothing is ever set there
+                yield y * width + x
+
+
+_NONZERO = re.compile(rb"[^\x00]")
+
+
+class SparseBoard(Board):
+    """A board for very large sizes. The grid and occupancy are ChunkedBytes, so memory and set up time
+    follow what is on the board rather than its area, and there is no free cell list.
+    Food goes on a random cell, trying again if that one is taken. Until the board is mostly full that
+    takes a try or two, after that the free cells are listed instead"""
+
+    def setup_grid(self):
+        """Sets up the grid data"""
+        self.grid = ChunkedBytes(self.width, self.height)
+        self.occupancy = ChunkedBytes(self.width, self.height)
+        self.occupied_count = 0
+        self.blocked_count = 0  # Cells taken up by obstacles
+
+        if self.level is not None and (self.level.width, self.level.height) != (self.width, self.height):
+            self.level = None
+        if self.level is not None:
+            for match in _NONZERO.finditer(self.level.obstacles):
+                self.grid[match.start()] = OBSTA
+                self.blocked_count += 1
+
+    def view(self) -> memoryview:
+        raise TypeError("Sparse boards have no flat grid to view, index board.grid instead")
+
+    def clear(self) -> None:
+        """Empty the board for a new game"""
+        if (self.grid.width, self.grid.height) != (self.width, self.height):
+            self.setup_grid()
             return None
-        else:
-            for node in AllSnakeNodes:
-                if node.X == x and node.Y == y:
-                    self.place_food()
-                    return None
+        if self.food_pos:
+            self.grid[self.food_pos[1] * self.width + self.food_pos[0]] = AVAIL
+            self.food_pos = []
+        self.occupancy.clear()
+        self.occupied_count = 0
+
+    def copy(self, rng: random.Random = None, into=None):
+        """A separate copy of the board, only the chunks in use are copied"""
+        board = SparseBoard.__new__(SparseBoard)
+        board.width = self.width
+        board.height = self.height
+        board.grid = self.grid.copy()
+        board.occupancy = self.occupancy.copy()
+        board.occupied_count = self.occupied_count
+        board.blocked_count = self.blocked_count
+        board.level = self.level
+        board.food_pos = list(self.food_pos)
+        board.rng = rng if rng is not None else self.rng
+        return board
+
+    def occupy(self, x: int, y: int, owner: int = 1) -> None:
+        """Mark a cell as having a snake on it"""
+        cell = y * self.width + x
+        if self.occupancy[cell]:
+            return None
+        self.occupancy[cell] = owner
+        self.occupied_count += 1
+
+    def release(self, x: int, y: int) -> None:
+        """Mark a cell as no longer having a snake on it"""
+        cell = y * self.width + x
+        if not self.occupancy[cell]:
+            return None
+        self.occupancy[cell] = 0
+        self.occupied_count -= 1
+
+    def is_full(self) -> bool:
+        """Check if there is nowhere left to put food"""
+        return self.occupied_count + self.blocked_count >= self.width * self.height
+
+    def place_food(self) -> bool:
+        """Place a bit of food in a random free location.
+        Returns False if the board is full and there is nowhere to put it"""
+        if self.is_full():
+            self.food_pos = []
+            return False
 
-        self.grid[y][x] = FOOD
+        cells = self.width * self.height
+        occupancy = self.occupancy
+        grid = self.grid
+        if (self.occupied_count + self.blocked_count) * 4 < cells * 3:
+            while True:
+                cell = self.rng.randrange(cells)
+                if not occupancy[cell] and grid[cell] == AVAIL:
+                    break
+        else:
+            # Mostly full, picking at random could take a long time
+            free = [cell for cell in range(cells) if not occupancy[cell] and grid[cell] == AVAIL]
+            cell = free[self.rng.randrange(len(free))]
 
+        grid[cell] = FOOD
+        y, x = divmod(cell, self.width)
         self.food_pos = [x, y]
+        return True
 
-    def food_ate(self) -> None:
-        """Remove the food that is currently on the board and then create a new one."""
-        self.grid[self.food_pos[1]][self.food_pos[0]] = AVAIL
-        self.place_food()
+    def filled_cells(self):
+        """Yield the (x, y) of every cell with a snake, food or an obstacle on it"""
+        for cells in (self.occupancy.nonzero(), self.grid.nonzero()):
+            for cell in cells:
+                y, x = divmod(cell, self.width)
+                yield x, y
 
 
-class SnakeNode:
-    """The main snake class"""
+def new_board(width: int, height: int, rng: random.Random = None, sparse: bool = None) -> Board:
+    """A Board, or a SparseBoard if sparse is set, or left as None and the board is very large"""
+    if sparse is None:
+        sparse = width * height > SPARSE_CELLS
+    return (SparseBoard if sparse else Board)(width, height, rng)
+
+
+class SnakeSegment:
+    """A read only view of one cell of a snake's body"""
+    __slots__ = ("X", "Y", "is_head")
 
     def __init__(self, pos_x: int, pos_y: int, is_head: bool = False):
         self.X = pos_x
         self.Y = pos_y
+        self.is_head = is_head
+
+
+class SnakeNodesView:
+    """List-like view over every node of a snake, head first.
+    Nodes are built on demand from the snake's body so nothing has to be kept in sync."""
+
+    def __init__(self, snake=None):
+        self.snake = snake
+
+    def __len__(self) -> int:
+        if self.snake is None:
+            return 0
+        return len(self.snake.body)
+
+    def __iter__(self):
+        if self.snake is None:
+            return
+        is_head = True
+        for x, y in self.snake.body:
+            yield SnakeSegment(x, y, is_head)
+            is_head = False
+
+    def __getitem__(self, index: int) -> SnakeSegment:
+        if self.snake is None:
+            raise IndexError("snake node index out of range")
+        if index < 0:
+            index += len(self.snake.body)
+        x, y = self.snake.body[index]
+        return SnakeSegment(x, y, index == 0)
+
+
+class SnakeNode:
+    """The main snake class.
+    The whole body lives on the head as a deque of (x, y), head first, so moving and growing are O(1)."""
+
+    def __init__(self, pos_x: int, pos_y: int, is_head: bool = False, input_depth: int = INPUT_DEPTH):
+        self.body = deque([(pos_x, pos_y)])
 
         self.direction = E  # N S E W
-        self.new_direction = E  # Used for updating the position
+        # Turns waiting for the coming ticks, oldest first. Each one is valid after the one before it
+        self.input_queue = deque()
+        self.input_depth = input_depth
 
         self.is_head = is_head
 
-        self.next_node = None
         self.increase_next_move = False
 
         self.level = 1
 
-    def set_position(self, pos_x: int, pos_y: int) -> None:
-        """Set the position to a given coordinate"""
-        next_node_pos = (self.X, self.Y)
+    def copy(self):
+        """A separate copy of the snake"""
+        snake = SnakeNode.__new__(SnakeNode)
+        snake.__dict__.update(self.__dict__)
+        snake.body = deque(self.body)
+        snake.input_queue = deque(self.input_queue)
+        return snake
+
+    @property
+    def new_direction(self):
+        """The direction the snake moves in on the next tick"""
+        return self.input_queue[0] if self.input_queue else self.direction
+
+    @new_direction.setter
+    def new_direction(self, direction) -> None:
+        """Replace any queued turns with this one"""
+        self.input_queue.clear()
+        if direction != self.direction:
+            self.input_queue.append(direction)
+
+    @property
+    def X(self) -> int:
+        return self.body[0][0]
+
+    @X.setter
+    def X(self, pos_x: int) -> None:
+        self.body[0] = (pos_x, self.body[0][1])
+
+    @property
+    def Y(self) -> int:
+        return self.body[0][1]
+
+    @Y.setter
+    def Y(self, pos_y: int) -> None:
+        self.body[0] = (self.body[0][0], pos_y)
+
+    @property
+    def length(self) -> int:
+        return len(self.body)
+
+    def set_position(self, pos_x: int, pos_y: int):
+        """Move the head to a given coordinate, the body follows it.
+        Returns the (x, y) the tail left, or None if the snake grew instead"""
+        self.body.appendleft((pos_x, pos_y))
 
-        # Update pos
-        self.X = pos_x
-        self.Y = pos_y
+        if self.increase_next_move:
+            self.increase_next_move = False
+            return None
+        return self.body.pop()
 
-        # Update the next node
-        if self.next_node is not None:
-            self.next_node.set_position(*next_node_pos)
-        elif self.increase_next_move:
-            node = SnakeNode(*next_node_pos)
-            self.next_node = node
-            AllSnakeNodes.append(node)
-
-    def update_position(self) -> None:
-        """Updates the position based on the objects direction"""
-        next_node_pos = (self.X, self.Y)
+    def update_position(self):
+        """Updates the position based on the objects direction.
+        Returns the (x, y) the tail left, or None if the snake grew instead"""
         if not self.is_head:
             return None
+
+        x, y = self.body[0]
         if self.direction == N:
-            self.Y -= 1
+            y -= 1
         elif self.direction == S:
-            self.Y += 1
+            y += 1
         elif self.direction == E:
-            self.X += 1
-        elif self.new_direction == W:
-            self.X -= 1
+            x += 1
+        elif self.direction == W:
+            x -= 1
         else:
             # Default to north if there invalid data in the Direction attr
             report_error(
@@ -149,87 +642,333 @@ class SnakeNode:
                 error_type=TypeError, raise_err=True)
 
             self.direction = N
-            self.update_position()
-            return None
+            return self.update_position()
 
-        # In theory these if statements should never run at the same time. But lets be honest
-        # The effect of them both running wouldn't matter as the position would only be set again
-        if self.increase_next_move:
-            node = SnakeNode(*next_node_pos)
-            self.next_node = node
-            AllSnakeNodes.append(node)
-            self.increase_next_move = False
-
-        if self.next_node is not None:
-            self.next_node.set_position(*next_node_pos)
+        return self.set_position(x, y)
 
     def update_direction(self, direction) -> bool:
-        """Update the Snakes direction"""
-        if direction in [N, S, E, W]:
-            # Now we check the the player isn't trying to go back on itself
-            if direction == N and self.direction == S:
-                return False
-            elif direction == S and self.direction == N:
-                return False
-            elif direction == W and self.direction == E:
-                return False
-            elif direction == E and self.direction == W:
-                return False
-            else:
-                self.new_direction = direction
-                return True
-        else:
+        """Queue a turn for a coming tick, so two presses inside one tick both happen.
+        A turn is checked against the direction the snake will be going in when it is taken, the last queued turn,
+        so turning back on yourself is refused however quickly the keys are pressed. Once input_depth turns are
+        waiting, a new one replaces the newest instead of queueing further behind"""
+        if direction not in OPPOSITE:
             report_error(f"SnakeNode.Direction is not one of the 4 directions required. ({N}, {S}, {E} or {W})")
             return False
 
+        queue = self.input_queue
+        full = len(queue) >= self.input_depth
+        # A turn that will replace the newest follows the one before it
+        before = len(queue) - 1 if full else len(queue)
+        heading = queue[before - 1] if before else self.direction
+        if direction == OPPOSITE[heading]:
+            return False
+        if full:
+            queue.pop()
+        if direction != heading:
+            queue.append(direction)
+        return True
+
     def cement_direction(self):
-        """Sets the direction to the new direction if they aren't already the same"""
-        """This function prevents the snake from going back on itself by pressing two directions in a tick"""
-        if self.new_direction != self.direction:
-            self.direction = self.new_direction
+        """Take the next queued turn, if there is one"""
+        if self.input_queue:
+            self.direction = self.input_queue.popleft()
 
     def level_up(self):
         """Increase the snakes length and level"""
-        if self.next_node is not None:
-            self.next_node.level_up()
-        else:
-            self.increase_next_move = True
+        # The tail stays put on the next move
+        self.increase_next_move = True
 
         # Increase level
         self.level += 1
 
 
+class TickScheduler:
+    """Keeps ticks on fixed deadlines using a monotonic clock.
+    Callers either sleep until the next deadline (wait) or ask how long that is (time_until_next),
+    then run however many ticks are due. After a stall at most max_catch_up ticks are run at once,
+    the rest are dropped so the game doesn't race to catch up."""
+
+    def __init__(self, interval_ms: int = 100, max_catch_up: int = 5):
+        self.interval = interval_ms / 1000
+        self.max_catch_up = max_catch_up
+        self.next_deadline = None
+
+        # Counters
+        self.ticks = 0  # Ticks handed out by due()
+        self.late_total = 0.0  # Sum of how late each wake up was after its deadline, in seconds
+        self.late_max = 0.0
+        self.late_count = 0
+        self.overruns = 0  # Wake ups that were a whole interval or more behind
+        self.dropped_ticks = 0  # Ticks skipped because more than max_catch_up were due
+
+    def set_interval(self, interval_ms: int) -> None:
+        """Change the time between ticks, takes effect from the next deadline"""
+        self.interval = interval_ms / 1000
+
+    def start(self) -> None:
+        """(Re)start the clock, the first tick is due one interval from now"""
+        self.next_deadline = monotonic() + self.interval
+
+    def due(self) -> int:
+        """How many ticks should be run now. Moves the deadline on past them"""
+        if self.next_deadline is None:
+            return 0
+
+        now = monotonic()
+        if now < self.next_deadline:
+            return 0
+
+        late = now - self.next_deadline
+        self.late_total += late
+        self.late_count += 1
+        if late > self.late_max:
+            self.late_max = late
+
+        count = 1 + int(late // self.interval) if self.interval > 0 else 1
+        # Keep to the original deadlines even when ticks are dropped, so the tick rate doesn't drift
+        self.next_deadline += count * self.interval
+        if count > 1:
+            self.overruns += 1
+        if count > self.max_catch_up:
+            self.dropped_ticks += count - self.max_catch_up
+            count = self.max_catch_up
+
+        self.ticks += count
+        return count
+
+    def time_until_next(self) -> float:
+        """Seconds until the next tick is due, 0 if it already is"""
+        if self.next_deadline is None:
+            return self.interval
+        return max(0.0, self.next_deadline - monotonic())
+
+    def wait(self, max_wait: float = None) -> None:
+        """Sleep until the next deadline, or for at most max_wait seconds"""
+        delay = self.time_until_next()
+        if max_wait is not None:
+            delay = min(delay, max_wait)
+        if delay > 0:
+            sleep(delay)
+
+    def stats(self) -> dict:
+        """Snapshot of the timing counters"""
+        return {"ticks": self.ticks,
+                "late_mean_ms": self.late_total / self.late_count * 1000 if self.late_count else 0.0,
+                "late_max_ms": self.late_max * 1000,
+                "overruns": self.overruns,
+                "dropped_ticks": self.dropped_ticks}
+
+
+class DurationHistogram:
+    """Fixed size histogram of durations in nanoseconds.
+    Buckets are log scaled with 8 per doubling, so percentiles come out within about 12%"""
+    SIZE = 62 * 8  # Enough for any 64 bit duration
+
+    def __init__(self):
+        self.counts = [0] * self.SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns: int) -> None:
+        if ns < 8:
+            index = ns
+        else:
+            # Keep the top 4 bits: the power of two picks the row, the next 3 bits the bucket in it
+            shift = ns.bit_length() - 4
+            index = ((shift + 1) << 3) + ((ns >> shift) & 7)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, pct: float) -> int:
+        """Upper edge of the bucket the given percentile falls in, in nanoseconds"""
+        if self.count == 0:
+            return 0
+        target = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                if index < 8:
+                    return index
+                shift = (index >> 3) - 1
+                return min(self.max, ((8 + (index & 7) + 1) << shift) - 1)
+        return self.max
+
+
+class TickProfiler:
+    """Per phase timings of Game.tick, plus rendering, kept in fixed size histograms"""
+    PHASES = ("cement_direction", "update_position", "collision_detection", "food", "render")
+
+    def __init__(self):
+        self.phases = {phase: DurationHistogram() for phase in self.PHASES}
+        self.food_ns = 0  # Time spent placing food during the current collision_detection call
+
+    def record(self, phase: str, ns: int) -> None:
+        self.phases[phase].add(ns)
+
+    def snapshot(self) -> dict:
+        """p50/p99/max and mean of every phase, in microseconds"""
+        data = {}
+        for phase, histogram in self.phases.items():
+            data[phase] = {"count": histogram.count,
+                           "mean_us": histogram.total / histogram.count / 1000 if histogram.count else 0.0,
+                           "p50_us": histogram.percentile(50) / 1000,
+                           "p99_us": histogram.percentile(99) / 1000,
+                           "max_us": histogram.max / 1000}
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def summary(self) -> str:
+        """One line per phase, for showing to a person"""
+        lines = []
+        for phase, data in self.snapshot().items():
+            lines.append(f"{phase}: p50 {data['p50_us']:.1f}us  p99 {data['p99_us']:.1f}us  "
+                         f"max {data['max_us']:.1f}us  ({data['count']})")
+        return "\n".join(lines)
+
+
+# Events that functions can be registered against with Game.add_hook. Each is called with the game.
+HOOKS = ("on_tick", "on_eat", "on_death", "on_win")
+
+# Snapshot format, see Game.snapshot. A fixed header followed by raw arrays:
+# rng state, grid, occupancy, free_slots, free_cells, body cells (head first), seed text, the input log
+# and the level (levels.Level.to_bytes). Of the snake's queued turns only the next one is kept
+SNAPSHOT_MAGIC = b"SNAK"
+SNAPSHOT_VERSION = 2
+_SNAPSHOT_HEADER = struct.Struct("<4sBBIIIBBBBBIiiIIIHdI")
+_RNG_WORDS = 625
+
+
 class Game:
-    """The main game handler"""
+    """The main game handler.
+
+    All game state (board, snake, rng, scheduler, hooks) belongs to the instance and nothing in this module
+    changes while games run, so any number of games can live in one process.
+    Separate games can be stepped at the same time from different threads, e.g. a thread pool running one
+    tick() per session. A single game must only be used by one thread at a time.
+    """
 
     def __init__(self, ms_per_update: int = 100, wrapping: bool = True,
                  console_output: bool = False, get_input: bool = False,
-                 settings_file: str = None):
-        global AllSnakeNodes
+                 settings_file: str = None, width: int = 30, height: int = 30,
+                 seed: int = None, rng: random.Random = None, record: bool = True,
+                 profile: bool = False, settings: dict = None, sparse: bool = None, level: "levels.Level" = None,
+                 track_changes: bool = False):
+        # Randomness. A game with the same seed, settings and inputs always plays out the same way.
+        # Without a seed or rng one is picked, so every game can be replayed from its record.
+        if seed is None and rng is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.rng = rng if rng is not None else random.Random()
+        if seed is not None:
+            self.rng.seed(seed)
+
+        # The direction used on every tick, see get_record
+        self.record = record
+        self.input_log = []
+
+        # Instrumentation, both cost next to nothing while unused
+        self.profiler = TickProfiler() if profile else None
+        self.hooks = {name: [] for name in HOOKS}
+
         # Tick speed
         # Runs an update every given milliseconds
         self.update_every_ms = ms_per_update
         self.last_update = 0
+        self.scheduler = TickScheduler(ms_per_update)
         self.board_wrapping = wrapping
 
-        # Board
-        self.board = Board()
+        # Board. sparse picks SparseBoard or Board, None leaves it to the board size (see new_board)
+        self.sparse = sparse
+        self.board = new_board(width, height, self.rng, sparse)
 
         self.console_output = console_output
+        self.renderer = None  # terminal.TerminalRenderer, made on the first console frame
 
         self.get_input = get_input
-        self.snake = SnakeNode(int(self.board.width / 2), int(self.board.height / 2), is_head=True)
-
-        # Empty the list of all snake nodes and then add the new snake head.
-        AllSnakeNodes = [self.snake]
+        self.input_depth = INPUT_DEPTH  # See SnakeNode.update_direction
+        # Called with the game before each tick to steer the snake, for bots and spectating
+        self.policy = None
+        self.setup_snake()
 
         self.GameOn = False
         self.GameState = OFF
+        self.ticks = 0  # Ticks played this game
+        self.death_cause = None  # HIT_SELF, HIT_WALL or HIT_OBSTACLE once the game is OVER
+
+        # Cells (x, y) whose contents changed since the last pop_changed_cells call.
+        # Only collected for something that draws the board, e.g. the GUI, otherwise nothing empties it
+        self.track_changes = track_changes or console_output
+        self.changed_cells = set()
 
-        # Settings
+        # Settings, from a file or handed straight in for headless runs
         self.settings_file = settings_file
         if settings_file is not None:
             self.load_settings()
+        if settings is not None:
+            self.apply_settings(settings)
+
+        # A level sets the board size, so it goes on last
+        if level is not None:
+            self.load_level(level)
+
+    def setup_snake(self) -> None:
+        """Create a new snake in the middle of the board, or at the level's spawn point"""
+        level = self.board.level
+        if level is None:
+            self.snake = SnakeNode(int(self.board.width / 2), int(self.board.height / 2), is_head=True,
+                                   input_depth=self.input_depth)
+        else:
+            self.snake = SnakeNode(*level.spawn, is_head=True, input_depth=self.input_depth)
+            self.snake.direction = level.direction
+        self.board.occupy(self.snake.X, self.snake.Y)
+
+    @property
+    def level(self):
+        """The levels.Level being played, None for an empty board"""
+        return self.board.level
+
+    def load_level(self, level) -> None:
+        """Play on a levels.Level, resizing the board to fit it, and start a fresh board.
+        None goes back to an empty board the same size"""
+        if level is not None:
+            self.resize_board(level.width, level.height)
+        self.board.set_level(level)
+        self.setup_board()
+
+    @property
+    def snake_nodes(self) -> SnakeNodesView:
+        """Every node of this game's snake, head first"""
+        return SnakeNodesView(self.snake)
+
+    def setup_board(self) -> None:
+        """Lay out a fresh board and snake, the same way a new Game with this seed would"""
+        if self.seed is not None:
+            self.rng.seed(self.seed)
+        self.board.clear()
+        self.board.place_food()
+        self.setup_snake()
+
+    def reset(self, seed: int = None) -> None:
+        """Start a new game on the same board storage.
+        Without a seed the next one is drawn from this game's rng, so a seeded game resets the same way every time"""
+        if seed is None and self.seed is not None:
+            seed = self.rng.getrandbits(64)
+        self.seed = seed
+
+        self.GameOn = False
+        self.GameState = OFF
+        self.ticks = 0
+        self.death_cause = None
+        self.input_log.clear()
+        self.changed_cells.clear()
+        self.setup_board()
 
     def load_settings(self) -> bool:
         """Update attributes based on settings file"""
@@ -238,203 +977,546 @@ class Game:
 
         if self.settings_file is None:
             return False
-        else:
-            path = "Files/Settings/"
-            filepath = path + self.settings_file
-
-            with open(filepath, "r") as file:
-                try:
-                    data = json.load(file)
-                except Exception as e:
-                    # print(e)
-                    report_error("File load issue. Check file format", error_type=IOError, raise_err=True)
-                    return False
 
-            if "width" in data:
-                self.board.width = int(data["width"])
-
-            if "height" in data:
-                self.board.height = int(data["height"])
+        try:
+            data = settings.game_settings(self.settings_file).get()
+        except ValueError as e:
+            report_error(f"File load issue. Check file format ({e})", error_type=IOError, raise_err=True)
+            return False
 
-            if "tick_speed" in data:
-                self.update_every_ms = int(data["tick_speed"])
+        self.apply_settings(data)
+        return True
 
-            if "height" in data or "width" in data:
-                self.board.setup_grid()
-                self.board.place_food()
-            return True
+    def apply_settings(self, data: dict) -> None:
+        """Use the given board size, tick speed and input depth, without going near a settings file.
+        Raises ValueError for invalid values, see settings.GAME_SCHEMA"""
+        valid, problems = settings.validate(settings.GAME_SCHEMA, data)
+        if problems:
+            raise ValueError("Invalid game settings: " + "; ".join(problems))
+
+        if "tick_speed" in valid:
+            self.update_every_ms = valid["tick_speed"]
+            self.scheduler.set_interval(self.update_every_ms)
+
+        if "input_depth" in valid:
+            self.input_depth = self.snake.input_depth = valid["input_depth"]
+
+        width = valid.get("width", self.board.width)
+        height = valid.get("height", self.board.height)
+        if (width, height) != (self.board.width, self.board.height):
+            # Any level is dropped as it no longer fits
+            self.resize_board(width, height)
+            # The old snake may not fit on the new board
+            self.setup_board()
+
+    def resize_board(self, width: int, height: int) -> None:
+        """Change the board size, swapping between Board and SparseBoard if the new size calls for it.
+        The board is set up again by the next setup_board"""
+        sparse = self.sparse if self.sparse is not None else width * height > SPARSE_CELLS
+        if sparse != isinstance(self.board, SparseBoard):
+            self.board = new_board(width, height, self.rng, sparse)
+        self.board.width = width
+        self.board.height = height
 
     def set_settings_file(self, filename: str) -> None:
         """Change the settings file"""
         self.settings_file = filename
 
     def update_settings(self, height: int = None, width: int = None, tick_speed: int = None) -> bool:
-        """Update a settings file"""
+        """Update a settings file. The file is written in the background, so this doesn't wait on the disk.
+        Returns False if there is no settings file or a value is invalid"""
 
         # file not set
         if self.settings_file is None:
             return False
 
-        if height is None and width is None and tick_speed is None:
-            return False
-
-        # Set data
-        if height is None:
-            height = self.board.height
-        if width is None:
-            width = self.board.width
-        if tick_speed is None:
-            tick_speed = self.update_every_ms
+        data = {}
+        if height is not None:
+            data["height"] = height
+        if width is not None:
+            data["width"] = width
+        if tick_speed is not None:
+            data["tick_speed"] = tick_speed
 
-        data = {"height": height,
-                "width": width,
-                "tick_speed": tick_speed}
-
-        # Upload to file
-        path = "Files/Settings/"
-        filepath = path + self.settings_file
+        if not data:
+            return False
 
-        with open(filepath, "w") as file:
-            json.dump(data, file)
-
-        return True
+        return settings.game_settings(self.settings_file).update(**data)
 
     def start_game(self):
         """Initialise the game variables"""
         self.GameOn = True
         self.GameState = ON
         self.last_update = time()
+        self.scheduler.set_interval(self.update_every_ms)
+        self.scheduler.start()
 
     def game_single_loop(self):
-        """Run a single game loop, still checks for tick"""
+        """Run a single game loop, only ticks when the scheduler says one is due"""
         if self.GameOn:
+            ticks = self.scheduler.due()
+            if ticks == 0:
+                return None
+
             # Move the snake and then check for collision
-            cur_time = time()
-            if cur_time - self.last_update > self.update_every_ms / 1000:
-                self.snake.cement_direction()
-                self.snake.update_position()
-                if self.collision_detection():
-                    self.GameOn = False
-                    self.GameState = OVER
-                    return None
+            for _ in range(ticks):
+                if self.policy is not None:
+                    direction = self.policy(self)
+                    if direction is not None:
+                        self.snake.update_direction(direction)
+                if not self.tick():
+                    break
+
+            self.last_update = time()
+
+            if self.console_output:
+                self.render()
+
+    def render(self) -> None:
+        """Draw the changes since the last frame to the terminal"""
+        start = perf_counter_ns()
+        if self.renderer is None:
+            import terminal
+            self.renderer = terminal.TerminalRenderer(self)
+        self.renderer.frame()
+        if self.profiler is not None:
+            self.profiler.record("render", perf_counter_ns() - start)
+
+    def tick(self) -> bool:
+        """Advance the game by exactly one tick, ignoring the clock.
+        Returns False if the game ended on this tick."""
+        snake = self.snake
+        board = self.board
+        changed = self.changed_cells if self.track_changes else None
+        food_pos = board.food_pos
+        level = snake.level
+        prof = self.profiler
+
+        if prof is not None:
+            t0 = perf_counter_ns()
+        snake.cement_direction()
+        self.ticks += 1
+        if self.record:
+            self.input_log.append(snake.direction)
+        if prof is not None:
+            t1 = perf_counter_ns()
+            prof.record("cement_direction", t1 - t0)
+
+        if changed is not None:
+            changed.add(snake.body[0])  # The old head is now body
+        vacated = snake.update_position()
+        if vacated is not None:
+            board.release(*vacated)
+            if changed is not None:
+                changed.add(vacated)
+        if prof is not None:
+            t2 = perf_counter_ns()
+            prof.record("update_position", t2 - t1)
+            prof.food_ns = 0
+
+        collided = self.collision_detection()
+        if changed is not None:
+            changed.add(snake.body[0])  # May be off the board if the snake died there
+            # place_food always sets a new list, so a different object means new food was placed
+            if board.food_pos is not food_pos and board.food_pos:
+                changed.add(tuple(board.food_pos))
+        if prof is not None:
+            # Eating is timed on its own inside collision_detection
+            prof.record("collision_detection", perf_counter_ns() - t2 - prof.food_ns)
+
+        hooks = self.hooks
+        if snake.level != level and hooks["on_eat"]:
+            self.run_hooks("on_eat")
+        if hooks["on_tick"]:
+            self.run_hooks("on_tick")
+
+        if collided:
+            self.GameOn = False
+            self.GameState = OVER
+            if hooks["on_death"]:
+                self.run_hooks("on_death")
+            return False
 
-                self.last_update = time()
+        if self.GameState == WON:
+            self.GameOn = False
+            if hooks["on_win"]:
+                self.run_hooks("on_win")
+            return False
+        return True
 
-                if self.console_output:
-                    os.system('cls')
-                    self.print_board()
+    def add_hook(self, event: str, function) -> None:
+        """Call function(game) whenever the event happens. See HOOKS for the events"""
+        if event not in self.hooks:
+            raise ValueError(f"Unknown hook event '{event}', expected one of {', '.join(HOOKS)}")
+        self.hooks[event].append(function)
+
+    def remove_hook(self, event: str, function) -> None:
+        """Stop calling a function registered with add_hook"""
+        self.hooks[event].remove(function)
+
+    def run_hooks(self, event: str) -> None:
+        for function in self.hooks[event]:
+            function(self)
+
+    def enable_profiler(self) -> TickProfiler:
+        """Start timing each tick phase. Any timings already collected are kept"""
+        if self.profiler is None:
+            self.profiler = TickProfiler()
+        return self.profiler
+
+    def disable_profiler(self) -> None:
+        self.profiler = None
+
+    def move_target(self, direction) -> tuple:
+        """The (x, y) the head would move into going the given way, after wrapping.
+        None if that would leave a board that doesn't wrap"""
+        dx, dy = MOVES[direction]
+        x = self.snake.X + dx
+        y = self.snake.Y + dy
+        if 0 <= x < self.board.width and 0 <= y < self.board.height:
+            return x, y
+        if not self.board_wrapping:
+            return None
+        return x % self.board.width, y % self.board.height
+
+    def is_safe_move(self, direction) -> bool:
+        """Check if going the given way on the next tick would keep the snake alive"""
+        if direction == OPPOSITE[self.snake.direction]:
+            return False  # Not allowed, the snake would just carry on
+        target = self.move_target(direction)
+        if target is None:
+            return False
+        if self.board.pos_lookup(*target) == OBSTA:
+            return False
+        if self.board.is_occupied(*target):
+            # The tail moves out of the way, unless the snake is growing
+            return target == self.snake.body[-1] and not self.snake.increase_next_move
+        return True
+
+    def fork(self, into=None, seed: int = None):
+        """An independent copy of the game as it is now, for trying out moves without touching this one.
+        The copy plays out the same way given the same inputs, unless seed gives it its own food placement
+        (which is also quicker than copying the rng). It has no hooks, profiler, renderer or input log.
+        into reuses a previous fork's storage rather than allocating new arrays. When into was forked from this
+        game, only the cells either game has changed since are copied, see Board.copy"""
+        board = into.board if into is not None else None
+        rng = into.rng if into is not None else random.Random()
+        if seed is None:
+            rng.setstate(self.rng.getstate())
+        else:
+            rng.seed(seed)
+
+        game = into if into is not None else Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        game.rng = rng
+        game.board = self.board.copy(rng, into=board)
+        game.snake = self.snake.copy()
+
+        game.record = False
+        game.input_log = []
+        game.track_changes = False
+        game.changed_cells = set()
+        game.hooks = {name: [] for name in HOOKS}
+        game.profiler = None
+        game.renderer = None
+        game.policy = None
+        game.scheduler = TickScheduler(self.update_every_ms)
+        return game
+
+    def rollout(self, policy, depth: int, n: int, first=None, seed: int = None) -> list:
+        """Play n possible futures of this game for up to depth ticks each, leaving this game untouched.
+        policy is called with the forked game each tick, as in farm.py. first forces the first move.
+        Food is placed from a new rng in each future, seeded from seed, as where it lands next isn't known.
+        Returns (ticks survived, levels gained, GameState) for each future"""
+        rng = random.Random(seed)
+        reset = getattr(policy, "reset", None)
+        level = self.snake.level
+        results = []
+
+        game = None
+        for _ in range(n):
+            future_seed = rng.getrandbits(64)
+            game = self.fork(into=game, seed=future_seed)
+            if reset is not None:
+                reset(future_seed)
+
+            snake = game.snake
+            ticks = 0
+            while ticks < depth and game.GameOn:
+                direction = first if ticks == 0 and first is not None else policy(game)
+                if direction is not None:
+                    snake.update_direction(direction)
+                game.tick()
+                ticks += 1
+
+            results.append((ticks, snake.level - level, game.GameState))
+        return results
+
+    def snapshot(self) -> bytes:
+        """The full game state as a binary blob, see restore.
+        The board arrays are copied in as they are, so this costs about a memcpy of the board.
+        Raises ValueError for a SparseBoard, which has no flat arrays to copy"""
+        board = self.board
+        if isinstance(board, SparseBoard):
+            raise ValueError("Games on sparse boards can't be snapshotted")
+        snake = self.snake
+        width = board.width
+
+        rng_version, rng_words, gauss_next = self.rng.getstate()
+        seed = b"" if self.seed is None else str(self.seed).encode()
+        inputs = "".join(self.input_log).encode()
+        body = array("i", [y * width + x for x, y in snake.body])
+        level = board.level.to_bytes() if board.level is not None else b""
+        food_x, food_y = board.food_pos if board.food_pos else (-1, -1)
+
+        header = _SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sys.byteorder == "little",
+            width, board.height, self.update_every_ms, self.board_wrapping,
+            STATES.index(self.GameState),
+            DIRECTIONS.index(snake.direction), DIRECTIONS.index(snake.new_direction),
+            snake.increase_next_move, snake.level, food_x, food_y,
+            len(body), len(board.free_cells), len(inputs), len(seed),
+            float("nan") if gauss_next is None else gauss_next, len(level))
+
+        return b"".join((header, array("I", rng_words).tobytes(), board.grid, board.occupancy,
+                         board.free_slots.tobytes(), board.free_cells.tobytes(), body.tobytes(), seed, inputs, level))
+
+    def restore(self, blob: bytes) -> None:
+        """Put the game back into the state a snapshot was taken in, including its settings and rng.
+        The board is resized if it needs to be, otherwise its storage is reused"""
+        (magic, version, little, width, height, tick_speed, wrapping, state, direction, new_direction, growing,
+         level, food_x, food_y, body_len, free_len, inputs_len, seed_len, gauss_next, level_len) = \
+            _SNAPSHOT_HEADER.unpack_from(blob)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Not a game snapshot, or one from another version")
+
+        cells = width * height
+        sizes = (_RNG_WORDS * 4, cells, cells, cells * 4, free_len * 4, body_len * 4, seed_len, inputs_len,
+                 level_len)
+        if len(blob) != _SNAPSHOT_HEADER.size + sum(sizes):
+            raise ValueError("Game snapshot is truncated or corrupt")
+
+        view = memoryview(blob)
+        parts = []
+        offset = _SNAPSHOT_HEADER.size
+        for size in sizes:
+            parts.append(view[offset:offset + size])
+            offset += size
+        rng_bytes, grid, occupancy, free_slots, free_cells, body_bytes, seed, inputs, level_bytes = parts
+
+        def int_array(typecode, data):
+            values = array(typecode)
+            values.frombytes(data)
+            if little != (sys.byteorder == "little"):
+                values.byteswap()
+            return values
+
+        board = self.board
+        if isinstance(board, SparseBoard):
+            board = self.board = Board(width, height, self.rng)
+        board.width = width
+        board.height = height
+        board.level = levels.Level.from_bytes(level_bytes) if level_len else None
+        if len(board.grid) != cells or len(board.occupancy) != cells:
+            board.setup_grid()
+        board.grid[:] = grid
+        board.occupancy[:] = occupancy
+        board.changes = None
+        board.free_slots = int_array("i", free_slots)
+        board.free_cells = int_array("i", free_cells)
+        board.food_pos = [food_x, food_y] if food_x >= 0 else []
+
+        self.rng.setstate((3, tuple(int_array("I", rng_bytes)), None if gauss_next != gauss_next else gauss_next))
+        self.seed = int(bytes(seed)) if seed_len else None
+        self.input_log = list(bytes(inputs).decode())
+        self.ticks = len(self.input_log)
+        self.death_cause = None
+
+        snake = SnakeNode(0, 0, is_head=True, input_depth=self.input_depth)
+        snake.body = deque(divmod(cell, width)[::-1] for cell in int_array("i", body_bytes))
+        snake.direction = DIRECTIONS[direction]
+        snake.new_direction = DIRECTIONS[new_direction]
+        snake.increase_next_move = bool(growing)
+        snake.level = level
+        self.snake = snake
+
+        self.update_every_ms = tick_speed
+        self.scheduler.set_interval(tick_speed)
+        self.board_wrapping = bool(wrapping)
+        self.GameState = STATES[state]
+        self.GameOn = self.GameState == ON
+        self.changed_cells.clear()
+
+    def state_hash(self) -> str:
+        """A short hash of everything that decides how the game carries on"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.board.width},{self.board.height},{self.board_wrapping},{self.GameState},"
+                 f"{self.snake.direction},{self.snake.level},{self.snake.increase_next_move},"
+                 f"{self.board.food_pos}".encode())
+        h.update(array("q", [y * self.board.width + x for x, y in self.snake.body]).tobytes())
+        return h.hexdigest()
+
+    def get_record(self) -> dict:
+        """Everything needed to replay this game: seed, settings and the direction taken each tick"""
+        return {"seed": self.seed,
+                "settings": {"width": self.board.width,
+                             "height": self.board.height,
+                             "wrapping": self.board_wrapping,
+                             "tick_speed": self.update_every_ms,
+                             "sparse": isinstance(self.board, SparseBoard),
+                             "level": self.board.level.to_bytes().hex() if self.board.level is not None else None},
+                "inputs": "".join(self.input_log),
+                "state": self.GameState,
+                "hash": self.state_hash()}
+
+    def pop_changed_cells(self) -> set:
+        """Get every cell that changed since this was last called, and start collecting again"""
+        changed = self.changed_cells
+        self.changed_cells = set()
+        return changed
 
     def game_loop(self):
-        if self.get_input:
-            import keyboard
         """The main game loop"""
-        self.GameOn = True
+        reader = None
+        if self.get_input:
+            import terminal
+            reader = terminal.KeyReader()
+            reader.start()
 
-        self.last_update = time()
+        self.start_game()
+        try:
+            if self.console_output:
+                self.render()
 
-        while self.GameOn:
-            if self.get_input:
-                if keyboard.is_pressed('up'):
-                    self.snake.update_direction(N)
-                elif keyboard.is_pressed('left'):
-                    self.snake.update_direction(W)
-                elif keyboard.is_pressed('right'):
-                    self.snake.update_direction(E)
-                elif keyboard.is_pressed('down'):
-                    self.snake.update_direction(S)
+            while self.GameOn:
+                self.game_single_loop()
 
-            # Move the snake and then check for collision
-            cur_time = time()
-            if cur_time - self.last_update > self.update_every_ms / 1000:
-                self.snake.cement_direction()
-                self.snake.update_position()
-                if self.collision_detection():
-                    self.GameOn = False
-                    self.GameState = OVER
+                if reader is None:
+                    self.scheduler.wait()
                     continue
 
-                self.last_update = time()
-
-                if self.console_output:
-                    os.system('cls')
-                    self.print_board()
+                # Sleep until the next tick, waking straight away for a key press
+                for key in reader.read(self.scheduler.time_until_next()):
+                    if key == terminal.QUIT:
+                        self.GameOn = False
+                        self.GameState = OVER
+                    else:
+                        self.snake.update_direction(terminal.KEY_DIRECTIONS[key])
+        finally:
+            if reader is not None:
+                reader.stop()
+            if self.renderer is not None:
+                self.renderer.close()
 
         if self.console_output:
-            print("\n\n\n\t\tGAME OVER")
+            if self.GameState == WON:
+                print("\n\n\n\t\tYOU WIN")
+            else:
+                print("\n\n\n\t\tGAME OVER")
+
+            if self.profiler is not None:
+                print()
+                print(self.profiler.summary())
 
     def collision_detection(self):
         """Check if the snake has collided with anything"""
 
+        x, y = self.snake.body[0]
+
         # Check for self collision, where the snake collides with it self.
-        for node in AllSnakeNodes:
-            if self.snake.X == node.X and self.snake.Y == node.Y and node.is_head != True:
-                return True
+        # The head's own cell is only marked once it survives the tick
+        if self.board.is_occupied(x, y):
+            self.death_cause = HIT_SELF
+            return True
 
-        lookup = self.board.pos_lookup(self.snake.X, self.snake.Y)
+        lookup = self.board.pos_lookup(x, y)
 
         if lookup == A:  # Position available
+            self.board.occupy(x, y)
             return False
-        elif lookup is None:  # Obstacle or off board
+        elif lookup is None:  # Off board
             if self.board_wrapping:
+                # Only the head is moved here, the body has already followed it this tick
                 if self.snake.X >= self.board.width:  # X-wrap from right to left
-                    self.snake.set_position(0, self.snake.Y)
+                    self.snake.X = 0
                 elif self.snake.X < 0:  # X-wrap from left to right
-                    self.snake.set_position(self.board.width - 1, self.snake.Y)
+                    self.snake.X = self.board.width - 1
                 elif self.snake.Y >= self.board.height:  # Y wrap from bottom to top
-                    self.snake.set_position(self.snake.X, 0)
+                    self.snake.Y = 0
                 elif self.snake.Y < 0:  # Y wrap from top to bottom
-                    self.snake.set_position(self.snake.X, self.board.height - 1)
+                    self.snake.Y = self.board.height - 1
                 else:
                     report_error("None returned when no reason for it is observed", error_type=TypeError,
                                  raise_err=True)
 
-                self.collision_detection()
-                return False
+                # Check the cell we wrapped into
+                return self.collision_detection()
             else:
+                self.death_cause = HIT_WALL
                 return True
 
-        elif lookup == 0:
+        elif lookup == O:  # Obstacle
+            self.death_cause = HIT_OBSTACLE
             return True
         elif lookup == F:  # Food
-            # Snake Levels up
+            # Snake Levels up. The head has to be on the board before new food is placed
+            self.board.occupy(x, y)
             self.snake.level_up()
-            self.board.food_ate()
+            prof = self.profiler
+            if prof is not None:
+                start = perf_counter_ns()
+            if not self.board.food_ate():
+                # The snake fills the whole board
+                self.GameState = WON
+            if prof is not None:
+                prof.food_ns = perf_counter_ns() - start
+                prof.record("food", prof.food_ns)
             return False
         else:
             # Debug and throw error if there is not a valid option
             report_error(f"invalid board option detected.", raise_err=True, error_type=TypeError)
 
-    def print_board(self):
-        """Placeholder function for outputting the board"""
-        print(f"Level: {self.snake.level}")
+    def cell_char(self, x: int, y: int) -> str:
+        """The character a cell is drawn with in the console"""
+        if self.board.is_occupied(x, y):
+            if (x, y) == self.snake.body[0]:
+                return "S"
+            return "s"
+
+        lookup = self.board.pos_lookup(x, y)
+        if lookup == A:
+            return "."
+        elif lookup == O:
+            return "X"
+        elif lookup == F:
+            return "*"
+        return str(lookup)
+
+    def board_text(self) -> str:
+        """The level and the whole board as text"""
+        lines = [f"Level: {self.snake.level}"]
+        cell_char = self.cell_char
         for y in range(self.board.height):
-            print(" ", end="")
-            for x in range(self.board.width):
-                node_found = False
-
-                for snakeNode in AllSnakeNodes:
-                    if snakeNode.X == x and snakeNode.Y == y:
-                        node_found = True
-                        if snakeNode.is_head:
-                            print("S", end="  ")
-                        else:
-                            print("s", end="  ")
-                        break
-
-                if not node_found:
-                    lookup = self.board.pos_lookup(x, y)
-                    if lookup == A:
-                        print(".", end="  ")
-                    elif lookup == O:
-                        print("X", end="  ")
-                    elif lookup == F:
-                        print("*", end="  ")
-                    else:
-                        print(str(self.board.pos_lookup(x, y)), end="  ")
-            print()
-        print()
+            lines.append(" " + "".join(cell_char(x, y) + "  " for x in range(self.board.width)))
+        return "\n".join(lines) + "\n"
+
+    def print_board(self):
+        """Print the whole board in one go"""
+        print(self.board_text())
 
 
 if __name__ == "__main__":
-    g = Game(ms_per_update=250, console_output=True, get_input=True)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play snake in the console")
+    parser.add_argument("--profile", action="store_true", help="Time each part of a tick and show it at the end")
+    parser.add_argument("--profile-out", help="Also write the timings to this JSON file")
+    args = parser.parse_args()
+
+    g = Game(ms_per_update=250, console_output=True, get_input=True,
+             profile=args.profile or args.profile_out is not None)
     g.game_loop()
+
+    if args.profile_out:
+        with open(args.profile_out, "w") as file:
+            file.write(g.profiler.to_json())
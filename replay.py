@@ -0,0 +1,81 @@
+import argparse
+import json
+import sys
+from time import perf_counter
+
+import levels
+import logic
+
+
+def save_record(filepath: str, record: dict) -> None:
+    """Append a game record (see logic.Game.get_record) to a JSON lines file"""
+    with open(filepath, "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def load_records(filepath: str):
+    """Yield every game record stored in a JSON lines file"""
+    with open(filepath, "r") as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def new_game(record: dict) -> logic.Game:
+    """A running game set up the way a recorded one started, ready for its inputs"""
+    if record["seed"] is None:
+        raise ValueError("Game record has no seed, it can't be replayed")
+
+    settings = record["settings"]
+    level = settings.get("level")
+    game = logic.Game(ms_per_update=settings["tick_speed"], wrapping=settings["wrapping"],
+                      width=settings["width"], height=settings["height"],
+                      seed=record["seed"], record=False, sparse=settings.get("sparse", False),
+                      level=levels.Level.from_bytes(bytes.fromhex(level)) if level else None)
+    game.GameOn = True
+    game.GameState = logic.ON
+    return game
+
+
+def replay(record: dict) -> logic.Game:
+    """Re-run a recorded game as fast as possible, without waiting for ticks.
+    Returns the game in its final state"""
+    game = new_game(record)
+    for direction in record["inputs"]:
+        game.snake.update_direction(direction)
+        if not game.tick():
+            break
+
+    return game
+
+
+def verify(record: dict) -> bool:
+    """Check a recorded game still ends in the same state"""
+    return replay(record).state_hash() == record["hash"]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded games and check they end the same way")
+    parser.add_argument("files", nargs="+", help="JSON lines files of game records")
+    args = parser.parse_args(argv)
+
+    checked = 0
+    failed = 0
+    ticks = 0
+    start = perf_counter()
+    for filepath in args.files:
+        for line_no, record in enumerate(load_records(filepath), start=1):
+            checked += 1
+            ticks += len(record["inputs"])
+            if not verify(record):
+                failed += 1
+                print(f"MISMATCH {filepath}:{line_no} seed={record['seed']}")
+    duration = perf_counter() - start
+
+    print(f"{checked} games ({ticks} ticks) replayed in {duration:.2f}s, {failed} mismatched")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
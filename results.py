@@ -0,0 +1,232 @@
+import argparse
+import getpass
+import math
+import os
+import sqlite3
+import sys
+from time import perf_counter, time
+
+import logic
+import settings
+
+RESULTS_FILE = os.path.join(settings.FILES_DIR, "results.db")
+
+# Rows are held back and written this many at a time, in one transaction
+BATCH_SIZE = 1000
+
+COLUMNS = ("player", "finished", "board", "width", "height", "wrapping", "level_name", "tick_speed", "seed",
+           "score", "length", "ticks", "duration", "outcome", "cause")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,       -- Who played, a name or "bot:<policy>"
+    finished REAL NOT NULL,     -- Unix time the result was added
+    board TEXT NOT NULL,        -- See board_key, scores are only compared on the same board
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    wrapping INTEGER NOT NULL,
+    level_name TEXT,
+    tick_speed INTEGER NOT NULL,
+    seed TEXT,                  -- Seeds are 64 bit unsigned, too big for an SQLite INTEGER
+    score INTEGER NOT NULL,     -- The snake's level, as shown on the end screen
+    length INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    duration REAL NOT NULL,     -- Seconds of play, ticks times the tick speed
+    outcome TEXT NOT NULL,      -- logic.OVER, logic.WON or farm.TIMEOUT
+    cause TEXT                  -- logic.HIT_SELF, HIT_WALL or HIT_OBSTACLE for games that are OVER
+);
+CREATE INDEX IF NOT EXISTS results_board_score ON results (board, score DESC);
+CREATE INDEX IF NOT EXISTS results_player_board_score ON results (player, board, score DESC);
+
+-- How many games on each board got each score. There are only as many scores as cells, so ranks and
+-- percentiles add up a few hundred rows here instead of counting through every result
+CREATE TABLE IF NOT EXISTS score_counts (
+    board TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (board, score)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS results_count AFTER INSERT ON results BEGIN
+    INSERT INTO score_counts (board, score, games) VALUES (new.board, new.score, 1)
+    ON CONFLICT (board, score) DO UPDATE SET games = games + 1;
+END;
+"""
+
+
+def board_key(width: int, height: int, wrapping: bool, level_name: str = None) -> str:
+    """Which leaderboard a game belongs to, e.g. "30x30 wrap" or "30x30 walls box" """
+    key = f"{width}x{height} {'wrap' if wrapping else 'walls'}"
+    if level_name:
+        key += f" {level_name}"
+    return key
+
+
+def make_row(player: str, width: int, height: int, wrapping: bool, tick_speed: int, seed, score: int,
+             length: int, ticks: int, outcome: str, cause: str = None, level_name: str = None) -> tuple:
+    """A results row in COLUMNS order"""
+    return (player, time(), board_key(width, height, wrapping, level_name), width, height, wrapping, level_name,
+            tick_speed, None if seed is None else str(seed), score, length, ticks, ticks * tick_speed / 1000,
+            outcome, cause if outcome == logic.OVER else None)
+
+
+def game_row(game: logic.Game, player: str, outcome: str = None) -> tuple:
+    """A results row for a game that has finished. outcome overrides its GameState, e.g. for a game cut short"""
+    board = game.board
+    return make_row(player, board.width, board.height, game.board_wrapping, game.update_every_ms, game.seed,
+                    game.snake.level, len(game.snake.body), game.ticks,
+                    outcome if outcome is not None else game.GameState, game.death_cause,
+                    board.level.name if board.level is not None else None)
+
+
+def percentile_rank(pct: float, count: int) -> int:
+    """Which of count sorted values, counting from 1, is the nearest rank pct percentile"""
+    return min(max(1, math.ceil(pct * count / 100)), count)
+
+
+def default_player() -> str:
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "player"
+
+
+class ResultsStore:
+    """Finished games in an SQLite database.
+
+    add() holds rows back and writes them batch_size at a time with one executemany in one transaction,
+    so writing a row costs a few microseconds. Call flush() to write the rest, close() does it too.
+    Leaderboards and personal bests are read off indexes, ranks and percentiles off the per board score counts
+    kept up to date by a trigger, so none of them look at more than a few hundred rows.
+    """
+
+    def __init__(self, path: str = RESULTS_FILE, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        # WAL lets the GUI read while a farm writes. A crash can lose the last transaction but never corrupts
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, row: tuple) -> None:
+        """Queue a row in COLUMNS order, see make_row and game_row"""
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_game(self, game: logic.Game, player: str, outcome: str = None) -> None:
+        self.add(game_row(game, player, outcome))
+
+    def flush(self) -> None:
+        """Write every queued row"""
+        if not self.pending:
+            return None
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                self.pending)
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    # Queries, each flushes first so it sees everything added
+
+    def leaderboard(self, board: str, limit: int = 10) -> list:
+        """The best (player, score, length, ticks, finished) on a board, best first"""
+        self.flush()
+        return self.connection.execute(
+            "SELECT player, score, length, ticks, finished FROM results WHERE board = ? "
+            "ORDER BY score DESC, id LIMIT ?", (board, limit)).fetchall()
+
+    def personal_best(self, player: str, board: str):
+        """A player's best score on a board, None if they haven't played it"""
+        self.flush()
+        row = self.connection.execute(
+            "SELECT MAX(score) FROM results WHERE player = ? AND board = ?", (player, board)).fetchone()
+        return row[0]
+
+    def rank(self, board: str, score: int) -> int:
+        """Where a score places on a board, 1 for the best. Equal scores share a rank"""
+        self.flush()
+        row = self.connection.execute(
+            "SELECT COALESCE(SUM(games), 0) FROM score_counts WHERE board = ? AND score > ?",
+            (board, score)).fetchone()
+        return row[0] + 1
+
+    def games(self, board: str) -> int:
+        self.flush()
+        row = self.connection.execute(
+            "SELECT COALESCE(SUM(games), 0) FROM score_counts WHERE board = ?", (board,)).fetchone()
+        return row[0]
+
+    def percentiles(self, board: str, pcts=(50, 90, 99)) -> dict:
+        """Nearest rank percentiles of the scores on a board, see percentile_rank"""
+        self.flush()
+        counts = self.connection.execute(
+            "SELECT score, games FROM score_counts WHERE board = ? ORDER BY score", (board,)).fetchall()
+        total = sum(games for _, games in counts)
+        result = {}
+        for pct in pcts:
+            if not total:
+                result[pct] = 0
+                continue
+            rank = percentile_rank(pct, total)
+            seen = 0
+            for score, games in counts:
+                seen += games
+                if seen >= rank:
+                    result[pct] = score
+                    break
+        return result
+
+    def causes(self, board: str) -> dict:
+        """How many games on a board ended each way, outcome or cause of death.
+        This one reads every result on the board"""
+        self.flush()
+        return dict(self.connection.execute(
+            "SELECT COALESCE(cause, outcome), COUNT(*) FROM results WHERE board = ? GROUP BY 1", (board,)))
+
+    def boards(self) -> list:
+        self.flush()
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT board FROM score_counts ORDER BY 1")]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Show the results store's leaderboards and statistics")
+    parser.add_argument("--db", default=RESULTS_FILE, help="Results database")
+    parser.add_argument("--board", help='Only this board, e.g. "30x30 wrap"')
+    parser.add_argument("--top", type=int, default=10, help="Leaderboard length")
+    args = parser.parse_args(argv)
+
+    with ResultsStore(args.db) as store:
+        for board in [args.board] if args.board else store.boards():
+            start = perf_counter()
+            top = store.leaderboard(board, args.top)
+            pcts = store.percentiles(board)
+            games = store.games(board)
+            causes = store.causes(board)
+            elapsed = perf_counter() - start
+
+            print(f"{board}: {games} games, score p50 {pcts[50]}  p90 {pcts[90]}  p99 {pcts[99]}")
+            print("  Ended by: " + ", ".join(f"{k} {v}" for k, v in sorted(causes.items())))
+            for place, (player, score, length, ticks, _) in enumerate(top, 1):
+                print(f"  {place:>3}. {player:<20} {score:>6} (length {length}, {ticks} ticks)")
+            print(f"  ({elapsed * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
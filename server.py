@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from time import perf_counter_ns
+
+import codec
+import levels
+import logic
+
+# A client's unsent output can grow to this many bytes before frames are dropped for it
+MAX_BUFFER = 64 * 1024
+
+# Longest line a client may send
+MAX_LINE = 1024
+
+# Client commands, one per line. A direction steers, as with SnakeNode.update_direction
+DIRECTION_COMMANDS = {"n": logic.N, "s": logic.S, "e": logic.E, "w": logic.W}
+RESTART = "restart"
+# The first line a client sends is PLAY to start a game or "watch <session>" to spectate one
+PLAY = "play"
+WATCH = "watch"
+
+
+class Session:
+    """One game on the server and the clients connected to it.
+    The first client plays, any others joining with WATCH only watch.
+    Frames are JSON lines, or codec records if binary is set"""
+
+    def __init__(self, session_id: int, game: logic.Game, binary: bool = False):
+        self.id = session_id
+        self.game = game
+        self.encoder = codec.Encoder(game) if binary else None
+        self.clients = []
+        self.frame = 0  # Frames sent so far, a frame can cover more than one tick if the server falls behind
+        self.keyframe_data = None
+        self.keyframe_frame = None
+
+    def advance(self, ticks: int) -> None:
+        """Run the ticks that are due as one frame"""
+        game = self.game
+        encoder = self.encoder
+        for _ in range(ticks):
+            running = game.tick()
+            if encoder is not None:
+                encoder.tick()
+            if not running:
+                break
+        self.frame += 1
+
+    def discard(self) -> None:
+        """Forget this frame's changes, nobody is connected to see them"""
+        self.game.changed_cells.clear()
+        if self.encoder is not None:
+            self.encoder.out.clear()
+
+    def cells(self, positions) -> list:
+        cell_char = self.game.cell_char
+        return [[x, y, cell_char(x, y)] for x, y in positions]
+
+    def delta(self) -> bytes:
+        """The cells that changed since the last frame as one line, or the frame's codec records.
+        Sent for every session every tick, so the line is formatted by hand. It is the same JSON json.dumps would
+        give, every value is a number or one of the game's own state and cell strings"""
+        game = self.game
+        if self.encoder is not None:
+            return self.encoder.take()
+        cell_char = game.cell_char
+        width, height = game.board.width, game.board.height
+        # A head that died off the edge of a board that doesn't wrap is reported too, there's nothing to draw there
+        cells = ",".join([f'[{x},{y},"{cell_char(x, y)}"]' for x, y in game.pop_changed_cells()
+                          if 0 <= x < width and 0 <= y < height])
+        return (f'{{"type":"delta","session":{self.id},"frame":{self.frame},"state":"{game.GameState}",'
+                f'"level":{game.snake.level},"cells":[{cells}]}}\n').encode()
+
+    def keyframe(self) -> bytes:
+        """The whole board as one line, or a codec keyframe. A client starts from one of these and applies deltas
+        after it. Only the filled cells are sent, the rest are empty.
+        Built at most once a frame however many clients need it"""
+        if self.keyframe_frame != self.frame:
+            game = self.game
+            board = game.board
+            if self.encoder is not None:
+                self.keyframe_data = self.encoder.keyframe()
+            else:
+                self.keyframe_data = _frame({"type": "key", "session": self.id, "frame": self.frame,
+                                            "state": game.GameState, "level": game.snake.level,
+                                            "width": board.width, "height": board.height,
+                                            "cells": self.cells(board.filled_cells())})
+            self.keyframe_frame = self.frame
+        return self.keyframe_data
+
+    def invalidate(self) -> None:
+        """The board changed outside a tick, every client starts again from a new keyframe"""
+        self.keyframe_frame = None
+        for client in self.clients:
+            client.needs_keyframe = True
+
+
+class Client:
+    """A connection and where it is up to"""
+
+    def __init__(self, writer: asyncio.StreamWriter, session: Session, plays: bool):
+        self.writer = writer
+        self.transport = writer.transport
+        self.session = session
+        self.plays = plays
+        self.needs_keyframe = True  # Next frame has to be a keyframe, e.g. after frames were dropped
+        self.dropped = 0
+
+    def send(self, delta: bytes) -> None:
+        """Send this tick's frame, unless the client is too far behind to take it.
+        A client that misses a frame is sent a keyframe once it has caught up, rather than every delta it missed"""
+        if self.transport.is_closing():
+            return None
+        if self.transport.get_write_buffer_size() > MAX_BUFFER:
+            self.needs_keyframe = True
+            self.dropped += 1
+            return None
+        if self.needs_keyframe:
+            self.send_keyframe()
+        else:
+            self.writer.write(delta)
+
+    def send_keyframe(self) -> None:
+        self.writer.write(self.session.keyframe())
+        self.needs_keyframe = False
+
+
+class GameServer:
+    """Hosts many games for remote clients from one asyncio loop.
+
+    Every session is ticked by one shared logic.TickScheduler, so the whole server costs one timer and one pass
+    over the sessions per tick. After each tick a session's changed cells are encoded once and the same bytes
+    written to each of its clients. Writes never wait: a client whose unsent output passes MAX_BUFFER has frames
+    dropped, and is sent the current keyframe once it catches up, so a slow client never holds up the ticks.
+
+    The client sends command lines (see PLAY, WATCH, DIRECTION_COMMANDS and RESTART). The server answers the
+    first with a JSON line, a hello with the session id or an error, then sends frames: JSON lines (see
+    Session.delta and Session.keyframe), or with binary set codec records, a few bytes a tick.
+    """
+
+    def __init__(self, tick_ms: int = 100, width: int = 30, height: int = 30, wrapping: bool = True,
+                 level: levels.Level = None, binary: bool = False):
+        self.game_options = {"width": width, "height": height, "wrapping": wrapping, "level": level}
+        self.binary = binary
+        self.scheduler = logic.TickScheduler(tick_ms)
+        self.sessions = {}
+        self.ids = itertools.count(1)
+
+        # Counters
+        self.step_ns = 0  # Time spent in the last step
+        self.step_total_ns = 0
+        self.steps = 0
+
+    def new_session(self) -> Session:
+        # Binary sessions send codec records, which don't need the changed cells
+        game = logic.Game(record=False, track_changes=not self.binary, **self.game_options)
+        game.start_game()
+        session = Session(next(self.ids), game, self.binary)
+        self.sessions[session.id] = session
+        return session
+
+    def step(self, ticks: int = 1) -> None:
+        """Tick every running game and send each session's clients what changed"""
+        start = perf_counter_ns()
+        for session in self.sessions.values():
+            if not session.game.GameOn:
+                continue
+            session.advance(ticks)
+            if not session.clients:
+                session.discard()
+                continue
+            delta = session.delta()
+            for client in session.clients:
+                client.send(delta)
+
+        self.step_ns = perf_counter_ns() - start
+        self.step_total_ns += self.step_ns
+        self.steps += 1
+
+    async def run(self) -> None:
+        """Tick on the scheduler's deadlines until cancelled"""
+        self.scheduler.start()
+        while True:
+            await asyncio.sleep(self.scheduler.time_until_next())
+            ticks = self.scheduler.due()
+            if ticks:
+                self.step(ticks)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = None
+        try:
+            line = await reader.readline()
+            command = line.decode(errors="replace").split()
+            if len(command) == 2 and command[0] == WATCH:
+                session = self.sessions.get(int(command[1])) if command[1].isdigit() else None
+                if session is None:
+                    writer.write(_frame({"type": "error", "error": f"No session {command[1]}"}))
+                    return None
+                client = Client(writer, session, plays=False)
+            elif command == [PLAY]:
+                session = self.new_session()
+                client = Client(writer, session, plays=True)
+            else:
+                writer.write(_frame({"type": "error", "error": f"Expected {PLAY} or {WATCH} <session>"}))
+                return None
+            session.clients.append(client)
+            writer.write(_frame({"type": "hello", "session": session.id,
+                                 "format": "binary" if self.binary else "json"}))
+            client.send_keyframe()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.command(client, line.decode(errors="replace").split())
+        except (ConnectionError, ValueError):
+            pass  # ValueError is a line over the reader's limit
+        finally:
+            if client is not None:
+                self.disconnect(client)
+            writer.close()
+
+    def command(self, client: Client, command: list) -> None:
+        if not command or not client.plays:
+            return None
+        game = client.session.game
+        if command[0] in DIRECTION_COMMANDS:
+            game.snake.update_direction(DIRECTION_COMMANDS[command[0]])
+        elif command[0] == RESTART:
+            game.reset()
+            game.start_game()
+            client.session.invalidate()
+
+    def disconnect(self, client: Client) -> None:
+        session = client.session
+        if client not in session.clients:
+            return None  # Already dropped along with its session
+        session.clients.remove(client)
+        # A session ends with its player, anyone watching is left with the last frame
+        if client.plays:
+            for other in session.clients:
+                other.writer.close()
+            session.clients.clear()
+            self.sessions.pop(session.id, None)
+
+    def stats(self) -> dict:
+        clients = [client for session in self.sessions.values() for client in session.clients]
+        return {"sessions": len(self.sessions),
+                "clients": len(clients),
+                "dropped_frames": sum(client.dropped for client in clients),
+                "step_ms": self.step_ns / 1e6,
+                "step_mean_ms": self.step_total_ns / self.steps / 1e6 if self.steps else 0.0,
+                **self.scheduler.stats()}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, path: str = None) -> None:
+        """Listen on a TCP port, or a Unix socket if path is given, and run until cancelled"""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, path, limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        ticker = asyncio.create_task(self.run())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            ticker.cancel()
+
+
+def _frame(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve snake games to remote clients")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="Listen on a Unix socket instead")
+    parser.add_argument("--tick-speed", type=int, default=100, help="ms per tick")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=30)
+    parser.add_argument("--no-wrap", action="store_true", help="Hitting the edge of the board ends the game")
+    parser.add_argument("--level", help="Play a level, see levels.load_level. Sets the board size")
+    parser.add_argument("--binary", action="store_true", help="Send frames as codec records instead of JSON")
+    args = parser.parse_args(argv)
+
+    logic.DEBUG_TEXT = False
+    level = levels.load_level(args.level) if args.level is not None else None
+    server = GameServer(args.tick_speed, args.width, args.height, not args.no_wrap, level, args.binary)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
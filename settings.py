@@ -0,0 +1,217 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+
+# Everything the game reads and writes lives next to the code, wherever it is run from
+FILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Files")
+SETTINGS_DIR = os.path.join(FILES_DIR, "Settings")
+
+GAME_FILE = "game_settings.json"
+GUI_FILE = "settings.json"
+
+# Each setting's type and, for numbers, the range it has to be in
+GAME_SCHEMA = {"width": (int, 2, 10000),
+               "height": (int, 2, 10000),
+               "tick_speed": (int, 1, 60000),
+               "input_depth": (int, 1, 16)}
+GAME_DEFAULTS = {"width": 30, "height": 30, "tick_speed": 100, "input_depth": 3}
+
+GUI_SCHEMA = {"colour_blind": (bool, None, None),
+              "control_left": (str, None, None),
+              "control_right": (str, None, None),
+              "control_up": (str, None, None),
+              "control_down": (str, None, None)}
+GUI_DEFAULTS = {"colour_blind": False,
+                "control_left": "Left",
+                "control_right": "Right",
+                "control_up": "Up",
+                "control_down": "Down"}
+
+# Writes wait this long for more changes before going to disk
+DEBOUNCE_SECONDS = 0.5
+
+
+def validate(schema: dict, data: dict) -> tuple:
+    """Check values against a schema. Returns (valid values, list of problems).
+    Keys the schema doesn't know about are left out"""
+    valid = {}
+    problems = []
+    for key, value in data.items():
+        if key not in schema:
+            continue
+        kind, low, high = schema[key]
+        # bool is a kind of int, but True isn't a width
+        if type(value) is not kind:
+            problems.append(f"{key} should be {kind.__name__}, not {value!r}")
+        elif low is not None and not low <= value <= high:
+            problems.append(f"{key} should be between {low} and {high}, not {value}")
+        else:
+            valid[key] = value
+    return valid, problems
+
+
+class SettingsFile:
+    """One JSON settings file.
+
+    get() parses the file once and hands back the cached values until the file's modification time changes.
+    update() changes the cached values straight away and writes them out on a background thread once changes
+    have stopped for DEBOUNCE_SECONDS. Files are written to a temporary file and renamed over the old one,
+    so a crash never leaves a half written file.
+    """
+
+    def __init__(self, filename: str, schema: dict, defaults: dict, directory: str = SETTINGS_DIR):
+        self.path = os.path.join(directory, filename)
+        self.schema = schema
+        self.defaults = defaults
+
+        self.lock = threading.Lock()
+        # Held for a whole flush, so writes go to disk in the order their values were taken
+        self.write_lock = threading.Lock()
+        self.values = None
+        self.stamp = None  # (mtime_ns, size) of the file the values came from
+        self.timer = None
+        self.dirty = False
+        self.writing = False  # The values are on their way to disk, the file doesn't have them yet
+
+    def _stat(self):
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def get(self) -> dict:
+        """The current settings, defaults filled in for anything missing or invalid"""
+        with self.lock:
+            # Unsaved changes win over the file
+            if self.values is not None and (self.dirty or self.writing or self._stat() == self.stamp):
+                return dict(self.values)
+
+            stamp = self._stat()
+            values = dict(self.defaults)
+            if stamp is not None:
+                try:
+                    with open(self.path, "r") as file:
+                        data = json.load(file)
+                    if not isinstance(data, dict):
+                        raise ValueError("expected a JSON object")
+                except (OSError, ValueError) as e:
+                    raise ValueError(f"Settings file {self.path} can't be read ({e})") from e
+
+                valid, problems = validate(self.schema, data)
+                values.update(valid)
+                if problems:
+                    import logic
+                    logic.report_error(f"Ignoring invalid settings in {self.path}: {'; '.join(problems)}")
+
+            self.values = values
+            self.stamp = stamp
+            return dict(values)
+
+    def update(self, **changes) -> bool:
+        """Change some settings. Returns False, changing nothing, if any of them are invalid.
+        The file is written in the background shortly afterwards"""
+        valid, problems = validate(self.schema, changes)
+        if problems or len(valid) != len(changes):
+            return False
+
+        try:
+            self.get()
+        except ValueError as e:
+            # Start again from the defaults, the write replaces the file that can't be read
+            import logic
+            logic.report_error(f"{e}. It will be replaced")
+            with self.lock:
+                if not self.dirty:
+                    self.values = dict(self.defaults)
+                    self.stamp = self._stat()
+        with self.lock:
+            self.values.update(valid)
+            self.dirty = True
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(DEBOUNCE_SECONDS, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+        return True
+
+    def flush(self) -> None:
+        """Write any unsaved changes now. Waits for a write already under way, e.g. the debounce timer's"""
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return None
+                data = json.dumps(self.values)
+                self.dirty = False
+                self.writing = True
+
+            # The disk is only touched outside self.lock, so get() never waits on a write
+            try:
+                self._write(data)
+            except BaseException:
+                with self.lock:
+                    self.dirty = True
+                    self.writing = False
+                raise
+
+            with self.lock:
+                self.writing = False
+                if not self.dirty:
+                    self.stamp = self._stat()
+
+    def _write(self, data: str) -> None:
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".tmp")
+        try:
+            # mkstemp makes the file private, keep the old file's permissions instead
+            try:
+                mode = os.stat(self.path).st_mode & 0o777
+            except OSError:
+                mode = 0o644
+            os.chmod(temp_path, mode)
+            with os.fdopen(handle, "w") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+# One SettingsFile per path, so everything in the process shares the same cache
+_files = {}
+_files_lock = threading.Lock()
+
+
+def open_settings(filename: str, schema: dict, defaults: dict) -> SettingsFile:
+    with _files_lock:
+        settings_file = _files.get(filename)
+        if settings_file is None:
+            settings_file = _files[filename] = SettingsFile(filename, schema, defaults)
+        return settings_file
+
+
+def game_settings(filename: str = GAME_FILE) -> SettingsFile:
+    """Board size, tick speed and how many turns a snake queues up"""
+    return open_settings(filename, GAME_SCHEMA, GAME_DEFAULTS)
+
+
+def gui_settings(filename: str = GUI_FILE) -> SettingsFile:
+    """Colour blind mode and controls"""
+    return open_settings(filename, GUI_SCHEMA, GUI_DEFAULTS)
+
+
+@atexit.register
+def flush_all() -> None:
+    """Write out every pending change, run at exit so nothing is lost to the debounce"""
+    with _files_lock:
+        files = list(_files.values())
+    for settings_file in files:
+        settings_file.flush()
@@ -0,0 +1,258 @@
+import argparse
+import os
+import sys
+from time import monotonic, sleep
+
+import levels
+import logic
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import select
+    import termios
+    import tty
+
+# Escape sequences
+CLEAR = "\x1b[H\x1b[2J"
+HIDE_CURSOR = "\x1b[?25l"
+SHOW_CURSOR = "\x1b[?25h"
+
+# Key names handed back by KeyReader.read
+KEY_DIRECTIONS = {"up": logic.N,
+                  "down": logic.S,
+                  "right": logic.E,
+                  "left": logic.W}
+QUIT = "quit"
+
+# Raw input -> key name. Arrow keys arrive as escape sequences, WASD also works
+_POSIX_KEYS = {b"w": "up", b"s": "down", b"d": "right", b"a": "left",
+               b"q": QUIT, b"\x03": QUIT}
+# Arrow keys arrive as ESC [ or ESC O, any parameters (e.g. 1;5 for ctrl) and then one of these
+_SEQUENCE_KEYS = {ord("A"): "up", ord("B"): "down", ord("C"): "right", ord("D"): "left"}
+# An escape sequence that is still incomplete after this many seconds was a lone Esc, or got cut off
+ESCAPE_TIMEOUT = 0.05
+_WINDOWS_KEYS = {"H": "up", "P": "down", "M": "right", "K": "left"}
+
+# Where the board sits on screen: under the level line, each cell a character and two spaces after a one space margin.
+# The same layout as logic.Game.board_text
+BOARD_TOP = 2
+CELL_WIDTH = 3
+
+
+class TerminalRenderer:
+    """Draws a game in an ANSI terminal.
+    The first frame is drawn in full, after that only the cells the game reports as changed are rewritten,
+    each frame going out in a single write"""
+
+    def __init__(self, game: logic.Game, out=None):
+        self.game = game
+        self.out = out if out is not None else sys.stdout
+        self.shown = None  # Character shown in each cell, y * width + x
+        self.shown_size = None
+        self.shown_level = None
+
+        if os.name == "nt":
+            # Switches the Windows console into ANSI mode
+            os.system("")
+
+    def frame(self) -> None:
+        """Bring the terminal up to date with the game"""
+        game = self.game
+        width, height = game.board.width, game.board.height
+
+        if self.shown_size != (width, height):
+            self.full_frame()
+            return None
+
+        parts = []
+        shown = self.shown
+        cell_char = game.cell_char
+        for x, y in game.pop_changed_cells():
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            char = cell_char(x, y)
+            if shown[y * width + x] != char:
+                shown[y * width + x] = char
+                parts.append(f"\x1b[{BOARD_TOP + y};{2 + x * CELL_WIDTH}H{char}")
+
+        if game.snake.level != self.shown_level:
+            self.shown_level = game.snake.level
+            parts.append(f"\x1b[1;1HLevel: {self.shown_level}")
+
+        if parts:
+            parts.append(f"\x1b[{BOARD_TOP + height};1H")
+            self.out.write("".join(parts))
+            self.out.flush()
+
+    def full_frame(self) -> None:
+        """Redraw everything"""
+        game = self.game
+        width, height = game.board.width, game.board.height
+        game.pop_changed_cells()
+
+        self.shown = [game.cell_char(x, y) for y in range(height) for x in range(width)]
+        self.shown_size = (width, height)
+        self.shown_level = game.snake.level
+
+        self.out.write(HIDE_CURSOR + CLEAR + game.board_text())
+        self.out.flush()
+
+    def close(self) -> None:
+        """Leave the cursor below the board and visible again"""
+        if self.shown_size is not None:
+            self.out.write(f"\x1b[{BOARD_TOP + self.shown_size[1]};1H")
+        self.out.write(SHOW_CURSOR)
+        self.out.flush()
+
+
+class KeyReader:
+    """Reads key presses from the terminal without waiting for enter and without blocking the game"""
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdin
+        self.saved_mode = None
+        self.pending = b""  # Start of an escape sequence split across reads
+        self.pending_since = 0.0
+        self.closed = False  # Input has ended, e.g. stdin was a pipe
+
+    def start(self) -> None:
+        """Put the terminal into cbreak mode, so keys arrive as they are pressed"""
+        if os.name != "nt" and self.stream.isatty():
+            fd = self.stream.fileno()
+            self.saved_mode = termios.tcgetattr(fd)
+            tty.setcbreak(fd)
+
+    def stop(self) -> None:
+        """Put the terminal back how it was"""
+        if self.saved_mode is not None:
+            termios.tcsetattr(self.stream.fileno(), termios.TCSADRAIN, self.saved_mode)
+            self.saved_mode = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def read(self, timeout: float = 0.0) -> list:
+        """Wait up to timeout seconds for input and return the names of the keys pressed.
+        Returns as soon as anything is read, so it doubles as the game loop's sleep"""
+        if os.name == "nt":
+            return self._read_windows(timeout)
+
+        if self.closed:
+            sleep(max(0.0, timeout))
+            return []
+
+        fd = self.stream.fileno()
+        ready, _, _ = select.select([fd], [], [], max(0.0, timeout))
+        if not ready:
+            if self.pending and monotonic() - self.pending_since > ESCAPE_TIMEOUT:
+                self.pending = b""
+            return []
+        data = os.read(fd, 64)
+        if not data:
+            self.closed = True
+            return []
+        return self._parse(self.pending + data)
+
+    def _parse(self, data: bytes) -> list:
+        keys = []
+        i = 0
+        while i < len(data):
+            if data[i] == 0x1b:
+                end = _sequence_end(data, i)
+                if end is None:
+                    break  # The rest of the sequence hasn't arrived yet
+                if end > i + 1:
+                    key = _SEQUENCE_KEYS.get(data[end - 1])
+                    if key is not None:
+                        keys.append(key)
+                # A lone Esc, or Alt held with a key, drops the Esc and reads the key as it is
+                i = end
+            else:
+                key = _POSIX_KEYS.get(data[i:i + 1].lower())
+                if key is not None:
+                    keys.append(key)
+                i += 1
+        if i < len(data) and not self.pending:
+            self.pending_since = monotonic()
+        self.pending = data[i:]
+        return keys
+
+    def _read_windows(self, timeout: float) -> list:
+        if not msvcrt.kbhit():
+            if timeout > 0:
+                # The Windows console has nothing to wait on, so sleep in short steps
+                end = monotonic() + timeout
+                while not msvcrt.kbhit() and monotonic() < end:
+                    sleep(0.002)
+            if not msvcrt.kbhit():
+                return []
+
+        keys = []
+        while msvcrt.kbhit():
+            char = msvcrt.getwch()
+            if char in ("\x00", "\xe0"):
+                key = _WINDOWS_KEYS.get(msvcrt.getwch())
+            else:
+                key = _POSIX_KEYS.get(char.lower().encode())
+            if key is not None:
+                keys.append(key)
+        return keys
+
+
+def _sequence_end(data: bytes, start: int):
+    """Where the escape sequence at start ends, start + 1 if the Esc doesn't start one,
+    or None if it can't be told yet"""
+    if start + 1 >= len(data):
+        return None
+    kind = data[start + 1]
+    if kind == ord("O"):
+        return start + 3 if start + 2 < len(data) else None
+    if kind != ord("["):
+        return start + 1
+    # Parameter and intermediate bytes, then a final byte from @ to ~
+    i = start + 2
+    while i < len(data):
+        if 0x40 <= data[i] <= 0x7e:
+            return i + 1
+        if not 0x20 <= data[i] <= 0x3f:
+            return i  # Not a valid sequence, drop what there was of it
+        i += 1
+    return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Play or watch snake in a terminal")
+    parser.add_argument("--spectate", metavar="POLICY",
+                        help="Watch a bot play instead: random, greedy or module:attribute (see farm.py)")
+    parser.add_argument("--width", type=int, default=30)
+    parser.add_argument("--height", type=int, default=30)
+    parser.add_argument("--tick-speed", type=int, default=100, help="ms per tick")
+    parser.add_argument("--no-wrap", action="store_true", help="Hitting the edge of the board ends the game")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--level", help="Play a level, PACK:NAME, a text level file or a level name from "
+                                        "Files/Levels/classic.snakelevels. Sets the board size")
+    args = parser.parse_args(argv)
+
+    level = levels.load_level(args.level) if args.level is not None else None
+    game = logic.Game(ms_per_update=args.tick_speed, wrapping=not args.no_wrap, console_output=True,
+                      get_input=args.spectate is None, width=args.width, height=args.height, seed=args.seed,
+                      level=level, track_changes=True)
+
+    if args.spectate is not None:
+        import farm
+        game.policy = farm.load_policy(args.spectate)
+        reset = getattr(game.policy, "reset", None)
+        if reset is not None:
+            reset(game.seed)
+
+    game.game_loop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
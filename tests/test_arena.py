@@ -0,0 +1,83 @@
+from collections import deque
+
+import arena
+import logic
+
+
+def setup(bodies: list, directions: list, food=(9, 9), width: int = 10, height: int = 10,
+          wrapping: bool = True) -> arena.Arena:
+    """An arena with each snake laid out head first along the given cells"""
+    match = arena.Arena(len(bodies), width, height, wrapping, seed=0)
+    board = match.board
+    for snake in match.snakes:
+        for x, y in snake.body:
+            board.release(x, y)
+    for i, (body, direction) in enumerate(zip(bodies, directions)):
+        snake = match.snakes[i]
+        snake.body = deque(body)
+        snake.direction = direction
+        for x, y in body:
+            board.occupy(x, y, i + 1)
+
+    board.grid[board.food_pos[1] * width + board.food_pos[0]] = logic.AVAIL
+    board.food_pos = list(food)
+    board.grid[food[1] * width + food[0]] = logic.FOOD
+    match.start_game()
+    return match
+
+
+def test_heads_into_the_same_cell_both_die():
+    match = setup([[(2, 5)], [(4, 5)]], [logic.E, logic.W])
+    assert not match.tick()
+    assert match.alive == [False, False]
+    assert match.winner is None
+    assert match.GameState == logic.OVER
+    # Dead snakes are cleared off the board
+    assert not any(match.board.occupancy)
+
+
+def test_heads_swapping_places_both_die():
+    match = setup([[(2, 5)], [(3, 5)]], [logic.E, logic.W])
+    assert not match.tick()
+    assert match.alive == [False, False]
+
+
+def test_head_into_a_body_dies():
+    match = setup([[(5, 4), (5, 5), (5, 6), (5, 7)], [(3, 5), (2, 5)]], [logic.N, logic.E])
+    match.tick()  # The second snake's head goes into (4, 5) and is safe
+    assert match.alive == [True, True]
+    assert not match.tick()  # Then into (5, 5), the first snake's body
+    assert match.alive == [True, False]
+    assert match.winner == 0
+    assert match.death_tick == [None, 1]
+
+
+def test_chasing_a_tail_that_moves_is_safe():
+    # The second snake moves into the first one's tail cell as the tail leaves it
+    match = setup([[(5, 5), (5, 6), (4, 6)], [(3, 6), (2, 6)]], [logic.N, logic.E])
+    assert match.tick()
+    assert match.alive == [True, True]
+    assert list(match.snakes[1].body) == [(4, 6), (3, 6)]
+    assert match.board.owner(4, 6) == 2
+
+
+def test_chasing_a_growing_tail_dies():
+    match = setup([[(5, 5), (5, 6), (4, 6)], [(3, 6), (2, 6)]], [logic.N, logic.E])
+    match.snakes[0].increase_next_move = True
+    assert not match.tick()
+    assert match.alive == [True, False]
+
+
+def test_a_snake_can_follow_its_own_tail():
+    match = setup([[(1, 1), (2, 1), (2, 2), (1, 2)], [(7, 7)]], [logic.W, logic.E])
+    for direction in (logic.S, logic.E, logic.N, logic.W) * 3:
+        match.steer(0, direction)
+        assert match.tick()
+    assert match.alive == [True, True]
+
+
+def test_food_only_goes_to_a_lone_head():
+    match = setup([[(4, 5)], [(6, 6)]], [logic.E, logic.E], food=(5, 5))
+    match.tick()
+    assert match.snakes[0].level == 2
+    assert match.board.food_pos != [5, 5]
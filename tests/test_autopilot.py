@@ -0,0 +1,77 @@
+from collections import deque
+
+import autopilot
+import levels
+import logic
+
+
+def full_search(pilot: autopilot.Autopilot) -> list:
+    """Every cell's distance to the food, a breadth first search over the board as it is now"""
+    board = pilot.game.board
+    distance = [autopilot.UNREACHABLE] * len(pilot.neighbours)
+    distance[pilot.food] = 0
+    queue = deque([pilot.food])
+    while queue:
+        cell = queue.popleft()
+        for other in pilot.neighbours[cell]:
+            if distance[other] == autopilot.UNREACHABLE and not pilot.blocked(other):
+                distance[other] = distance[cell] + 1
+                queue.append(other)
+    return distance
+
+
+def check_real_paths(pilot: autopilot.Autopilot) -> None:
+    """Every cell with a distance is open and, unless it is the food, has a neighbour nearer the food"""
+    distance = pilot.distance
+    for cell, d in enumerate(distance):
+        if d == autopilot.UNREACHABLE:
+            continue
+        assert not pilot.blocked(cell)
+        assert d == 0 or min(distance[other] for other in pilot.neighbours[cell]) < d
+
+
+def play(game: logic.Game, ticks: int, every: int = 1, check=None) -> None:
+    pilot = autopilot.Autopilot()
+    game.start_game()
+    while game.GameOn and game.ticks < ticks:
+        direction = pilot(game)
+        if check is not None and game.ticks % every == 0:
+            check(pilot)
+        if direction is not None:
+            game.snake.update_direction(direction)
+        game.tick()
+
+
+def test_settled_map_matches_a_full_search():
+    def check(pilot):
+        check_real_paths(pilot)
+        pilot.work()
+        assert pilot.distance == full_search(pilot)
+
+    play(logic.Game(width=24, height=24, seed=1, record=False), 1500, every=7, check=check)
+
+
+def test_map_only_holds_real_paths_between_settles():
+    game = logic.Game(width=40, height=40, seed=2, record=False)
+    play(game, 1500, every=3, check=check_real_paths)
+    assert game.GameOn
+
+
+def test_settled_map_matches_a_full_search_around_obstacles():
+    obstacles = bytearray(20 * 20)
+    for y in range(3, 17):
+        obstacles[y * 20 + 10] = 1
+    level = levels.Level(20, 20, bytes(obstacles), spawn=(4, 10))
+
+    def check(pilot):
+        pilot.work()
+        assert pilot.distance == full_search(pilot)
+
+    play(logic.Game(width=20, height=20, seed=3, record=False, wrapping=False, level=level), 1000, every=5,
+         check=check)
+
+
+def test_fills_most_of_a_small_board():
+    game = logic.Game(width=12, height=12, seed=4, record=False)
+    play(game, 20000)
+    assert len(game.snake.body) >= 100
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+import batch
+import logic
+
+BOARDS = 8
+TICKS = 1000
+
+
+def pick(game: logic.Game, rng: random.Random):
+    """Mostly safe moves so games last a while, with some ticks of no input or of turning back on the snake"""
+    if rng.random() < 0.1 or not game.GameOn:
+        return rng.choice(logic.DIRECTIONS + (None,))
+    safe = [direction for direction in logic.DIRECTIONS if game.is_safe_move(direction)]
+    return rng.choice(safe) if safe else None
+
+
+@pytest.mark.parametrize("wrapping", [True, False])
+def test_batch_game_matches_game(wrapping):
+    """BatchGame and logic.Game given the same seeds and inputs play the same games"""
+    seeds = list(range(BOARDS))
+    games = [logic.Game(width=12, height=10, wrapping=wrapping, seed=seed, record=False) for seed in seeds]
+    for game in games:
+        game.start_game()
+    boards = batch.BatchGame(BOARDS, width=12, height=10, wrapping=wrapping, seeds=seeds)
+    rng = random.Random(0)
+
+    for _ in range(TICKS):
+        directions = [pick(game, rng) for game in games]
+        for game, direction in zip(games, directions):
+            if game.GameOn:
+                if direction is not None:
+                    game.snake.update_direction(direction)
+                game.tick()
+        _, _, done = boards.step(batch.encode_directions(directions))
+
+        for i, game in enumerate(games):
+            assert done[i] == (not game.GameOn)
+            assert boards.won[i] == (game.GameState == logic.WON)
+            assert boards.level[i] == game.snake.level
+            if game.GameOn:
+                assert boards.snake_positions(i) == list(game.snake.body)
+                assert boards.food_position(i) == list(game.board.food_pos)
+        if done.all():
+            break
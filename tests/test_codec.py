@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import codec
+import levels
+import logic
+
+
+def assert_decoded(decoder: codec.Decoder, game: logic.Game) -> None:
+    board = game.board
+    assert (decoder.width, decoder.height, decoder.wrapping) == (board.width, board.height, game.board_wrapping)
+    assert decoder.state == game.GameState
+    assert decoder.direction == game.snake.direction
+    assert decoder.level == game.snake.level
+    assert decoder.food == (tuple(board.food_pos) if board.food_pos else None)
+    assert list(decoder.body) == list(game.snake.body)
+    if board.level is None:
+        assert decoder.obstacles is None
+    else:
+        assert decoder.obstacles.obstacles == board.level.obstacles
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_round_trip(seed):
+    """Decoding an Encoder's bytes, fed in random pieces, gives back the game after every tick"""
+    rng = random.Random(seed)
+    level = levels.load_level("cross") if seed % 3 == 0 else None
+    game = logic.Game(width=16, height=12, wrapping=seed % 2 == 0, seed=seed, record=False, level=level)
+    game.start_game()
+    encoder = codec.Encoder(game, keyframe_every=rng.choice([8, 64, codec.KEYFRAME_EVERY]))
+    decoder = codec.Decoder()
+    unsent = b""
+
+    for tick in range(600):
+        if not game.GameOn:
+            game.reset()
+            game.start_game()
+        game.snake.update_direction(rng.choice(logic.DIRECTIONS))
+        game.tick()
+        encoder.tick()
+
+        unsent += encoder.take()
+        cut = rng.randrange(len(unsent) + 1)
+        decoder.feed(unsent[:cut])
+        decoder.feed(unsent[cut:])
+        unsent = b""
+        assert decoder.ticks == encoder.ticks
+        assert_decoded(decoder, game)
+
+
+def test_join_mid_stream():
+    """A decoder that starts partway through skips to the next keyframe"""
+    game = logic.Game(seed=5, record=False)
+    game.start_game()
+    encoder = codec.Encoder(game, keyframe_every=16)
+    decoder = codec.Decoder()
+    for tick in range(100):
+        game.snake.update_direction(logic.DIRECTIONS[tick // 7 % 4])
+        if not game.tick():
+            break
+        encoder.tick()
+        data = encoder.take()
+        if tick >= 40:
+            decoder.feed(data)
+    assert decoder.synced
+    assert_decoded(decoder, game)
+
+
+def test_encode_record():
+    game = logic.Game(seed=9)
+    game.start_game()
+    rng = random.Random(9)
+    while game.tick():
+        game.snake.update_direction(rng.choice(logic.DIRECTIONS))
+    decoder = codec.Decoder()
+    decoder.feed(codec.encode_record(game.get_record()))
+    assert_decoded(decoder, game)
@@ -0,0 +1,82 @@
+import random
+
+import farm
+import logic
+
+
+def same_board(a: logic.Board, b: logic.Board) -> bool:
+    return (a.grid == b.grid and a.occupancy == b.occupancy and a.free_cells == b.free_cells
+            and a.free_slots == b.free_slots and a.food_pos == b.food_pos)
+
+
+def play(game: logic.Game, ticks: int, policy) -> None:
+    for _ in range(ticks):
+        if not game.GameOn:
+            return None
+        direction = policy(game)
+        if direction is not None:
+            game.snake.update_direction(direction)
+        game.tick()
+
+
+def test_fork_leaves_the_original_alone():
+    game = logic.Game(width=20, height=20, seed=0, record=False)
+    game.start_game()
+    before = game.board.copy()
+    fork = game.fork()
+    play(fork, 30, farm.GreedyPolicy())
+    assert same_board(game.board, before)
+    assert not same_board(fork.board, before)
+
+
+def test_reused_forks_match_a_full_copy():
+    # Big enough a board that most forks catch up rather than copy
+    game = logic.Game(width=100, height=100, seed=1, record=False)
+    game.start_game()
+    policy = farm.GreedyPolicy()
+    rng = random.Random(0)
+    fork = grandchild = None
+    for step in range(300):
+        fork = game.fork(into=fork, seed=step)
+        assert same_board(fork.board, game.board.copy())
+        play(fork, rng.randrange(6), policy)
+
+        grandchild = fork.fork(into=grandchild, seed=step)
+        assert same_board(grandchild.board, fork.board.copy())
+        play(grandchild, rng.randrange(3), policy)
+
+        if rng.random() < 0.3:
+            play(game, 1, policy)
+
+
+def test_catching_up_only_touches_changed_cells():
+    game = logic.Game(width=200, height=200, seed=2, record=False)
+    game.start_game()
+    fork = game.fork()
+    play(fork, 10, farm.GreedyPolicy())
+    board = fork.board
+    assert board.catch_up(game.board)
+    assert same_board(board, game.board)
+    assert len(board.changes) - board.source[4] < 50
+
+
+def test_a_fork_of_another_game_is_copied_in_full():
+    game = logic.Game(width=30, height=30, seed=3, record=False)
+    game.start_game()
+    other = logic.Game(width=30, height=30, seed=4, record=False)
+    other.start_game()
+    fork = other.fork()
+    assert not fork.board.catch_up(game.board)
+    fork = game.fork(into=fork)
+    assert same_board(fork.board, game.board)
+
+
+def test_a_new_game_on_the_original_is_caught():
+    game = logic.Game(width=100, height=100, seed=5, record=False)
+    game.start_game()
+    fork = game.fork()
+    game.reset(seed=6)
+    game.start_game()
+    assert not fork.board.catch_up(game.board)
+    fork = game.fork(into=fork)
+    assert same_board(fork.board, game.board)
@@ -0,0 +1,72 @@
+import random
+
+import logic
+import replay
+
+
+def test_two_presses_in_one_tick_both_happen():
+    game = logic.Game(seed=0, record=False)
+    game.start_game()
+    x, y = game.snake.body[0]
+    game.snake.update_direction(logic.N)
+    game.snake.update_direction(logic.W)
+    game.tick()
+    assert game.snake.body[0] == (x, y - 1)
+    game.tick()
+    assert game.snake.body[0] == (x - 1, y - 1)
+
+
+def test_turns_are_checked_against_the_queued_direction():
+    snake = logic.SnakeNode(5, 5, is_head=True)  # Heading east
+    assert snake.update_direction(logic.N)
+    # South would turn back on the queued north, west on the current east
+    assert not snake.update_direction(logic.S)
+    assert list(snake.input_queue) == [logic.N]
+    assert not logic.SnakeNode(5, 5, is_head=True).update_direction(logic.W)
+    # Going the way the snake will already be heading queues nothing
+    assert snake.update_direction(logic.N)
+    assert list(snake.input_queue) == [logic.N]
+
+
+def test_a_full_queue_replaces_the_newest_turn():
+    snake = logic.SnakeNode(5, 5, is_head=True, input_depth=2)
+    snake.update_direction(logic.N)
+    snake.update_direction(logic.W)
+    assert not snake.update_direction(logic.S)  # Checked against N, the turn before the newest
+    assert snake.update_direction(logic.E)
+    assert list(snake.input_queue) == [logic.N, logic.E]
+
+
+def test_depth_one_keeps_the_old_behaviour():
+    snake = logic.SnakeNode(5, 5, is_head=True, input_depth=1)
+    snake.update_direction(logic.N)
+    assert snake.update_direction(logic.S)  # Only the current direction counts, as before the queue
+    snake.cement_direction()
+    assert snake.direction == logic.S
+
+
+def test_input_depth_setting():
+    game = logic.Game(settings={"input_depth": 5})
+    assert game.snake.input_depth == 5
+    game.reset()
+    assert game.snake.input_depth == 5
+
+
+def test_replays_match_with_several_presses_a_tick():
+    rng = random.Random(1)
+    for seed in range(5):
+        game = logic.Game(seed=seed)
+        game.start_game()
+        while game.ticks < 1000:
+            for _ in range(rng.randrange(4)):
+                game.snake.update_direction(rng.choice(logic.DIRECTIONS))
+            if not game.tick():
+                break
+        assert replay.verify(game.get_record())
+
+
+def test_copies_have_their_own_queue():
+    snake = logic.SnakeNode(5, 5, is_head=True)
+    copy = snake.copy()
+    snake.update_direction(logic.N)
+    assert not copy.input_queue
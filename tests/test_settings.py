@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+
+import settings
+
+
+def open_file(directory, filename="game.json") -> settings.SettingsFile:
+    return settings.SettingsFile(filename, settings.GAME_SCHEMA, settings.GAME_DEFAULTS, str(directory))
+
+
+def test_defaults_and_invalid_values(tmp_path):
+    (tmp_path / "game.json").write_text(json.dumps({"width": 40, "height": "tall", "unknown": 1}))
+    values = open_file(tmp_path).get()
+    assert values["width"] == 40
+    assert values["height"] == settings.GAME_DEFAULTS["height"]
+    assert "unknown" not in values
+
+
+def test_update_is_debounced(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DEBOUNCE_SECONDS", 0.05)
+    settings_file = open_file(tmp_path)
+    for width in range(10, 20):
+        assert settings_file.update(width=width)
+    # Changes show straight away, the file only once they stop
+    assert settings_file.get()["width"] == 19
+    assert not (tmp_path / "game.json").exists()
+
+    time.sleep(0.3)
+    assert json.loads((tmp_path / "game.json").read_text())["width"] == 19
+
+
+def test_invalid_update_changes_nothing(tmp_path):
+    settings_file = open_file(tmp_path)
+    assert not settings_file.update(width=20, height=1)
+    assert settings_file.get()["width"] == settings.GAME_DEFAULTS["width"]
+
+
+def test_write_is_atomic(tmp_path):
+    path = tmp_path / "game.json"
+    path.write_text(json.dumps({"width": 40}))
+    os.chmod(path, 0o640)
+    settings_file = open_file(tmp_path)
+    settings_file.update(width=50)
+    settings_file.flush()
+
+    assert json.loads(path.read_text())["width"] == 50
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ["game.json"]  # No temporary files left behind
+
+
+def test_corrupt_file_is_repaired(tmp_path):
+    path = tmp_path / "game.json"
+    path.write_text("{not json")
+    settings_file = open_file(tmp_path)
+
+    assert settings_file.update(width=25)
+    settings_file.flush()
+    values = json.loads(path.read_text())
+    assert values["width"] == 25
+    assert values["height"] == settings.GAME_DEFAULTS["height"]
+
+
+def test_concurrent_flushes_keep_the_newest(tmp_path):
+    settings_file = open_file(tmp_path)
+
+    def writer(start):
+        for width in range(start, start + 100):
+            settings_file.update(width=width)
+            if width % 7 == 0:
+                settings_file.flush()
+
+    threads = [threading.Thread(target=writer, args=(start,)) for start in (100, 300, 500, 700)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    settings_file.flush()
+
+    assert json.loads((tmp_path / "game.json").read_text())["width"] == settings_file.get()["width"]
+    assert os.listdir(tmp_path) == ["game.json"]